@@ -0,0 +1,156 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# cs2ss_memory.py: memory used by cs2ss.py trade records.
+#
+# Loads a synthetic CommSec file into RawTrade/TradePosition objects,
+# keeping every trade (as cs2ss.py does without --stream), once with the
+# __slots__ classes from cs2ss.py and once with plain classes that have a
+# per-instance __dict__ (as cs2ss.py used to).  Each variant runs in its
+# own process, and the growth in peak RSS is reported.
+#
+#   python -m bench.cs2ss_memory --rows 1000000
+#
+
+from __future__ import division, print_function
+import os
+import sys
+import csv
+import resource
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, '.')
+import cs2ss
+from bench.generators import commsec_rows, write_csv
+
+
+class DictRawTrade:
+    pass
+
+
+class DictTradePosition:
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.trade_list = []
+        self.qty = 0
+        self.open_date = ""
+        self.close_date = ""
+        self.buy_total_price = 0
+        self.buy_price = 0
+        self.buy_qty = 0
+        self.sell_total_price = 0
+        self.sell_price = 0
+        self.sell_qty = 0
+        self.gross_profit = 0
+        self.total_brokerage = 0
+
+
+VARIANTS = {
+    'dict' : (DictRawTrade, DictTradePosition),
+    'slots' : (cs2ss.RawTrade, cs2ss.TradePosition),
+}
+
+
+def max_rss():
+    ''' Peak RSS of this process, in bytes.'''
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return rss
+    return rss * 1024
+
+
+def instance_size(obj):
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def load(filename, trade_cls, position_cls):
+    ''' Same parsing as cs2ss.py, keeping every trade and position.'''
+    open_pos = {}
+    closed = []
+    reader = csv.reader(open(filename, 'rb'))
+    next(reader)
+    for row in reader:
+        t = trade_cls()
+        t.symbol = row[cs2ss.I_SYMBOL].strip()
+        t.date = cs2ss.parse_date_string(row[cs2ss.I_DATE])
+        t.type = row[cs2ss.I_TYPE]
+        t.qty = int(row[cs2ss.I_QTY])
+        t.price = cs2ss.parse_money(row[cs2ss.I_PRICE])
+        t.brokerage = cs2ss.parse_money(row[cs2ss.I_BROKERAGE])
+        t.total = cs2ss.parse_money(row[cs2ss.I_TOTAL])
+        t.id = row[cs2ss.I_ID]
+        if t.type[0] == 'S':
+            t.qty *= -1
+        pos = open_pos.get(t.symbol)
+        if pos is None:
+            pos = open_pos[t.symbol] = position_cls(t.symbol)
+        pos.trade_list.append(t)
+        pos.qty += t.qty
+        if pos.qty == 0:
+            closed.append(open_pos.pop(t.symbol))
+    return closed, open_pos
+
+
+def run_child(variant, filename, rows):
+    trade_cls, position_cls = VARIANTS[variant]
+    before = max_rss()
+    closed, open_pos = load(filename, trade_cls, position_cls)
+    grown = max_rss() - before
+    pos = closed[0]
+    print('%-6s %10d %10d %12.1f %10.1f' %
+          (variant, instance_size(pos.trade_list[0]), instance_size(pos),
+           grown / (1024 * 1024), grown / rows))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='cs2ss.py memory benchmark')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--symbols', type=int, default=500)
+    parser.add_argument('--child', choices=sorted(VARIANTS))
+    parser.add_argument('--file')
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.file, args.rows)
+        return
+
+    fd, filename = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    try:
+        write_csv(filename, commsec_rows(args.rows, args.symbols))
+        print('%d trades, %d symbols' % (args.rows, args.symbols))
+        print('%-6s %10s %10s %12s %10s' %
+              ('class', 'trade B', 'position B', 'RSS MB', 'B/trade'))
+        sys.stdout.flush()
+        for variant in ('dict', 'slots'):
+            subprocess.check_call([sys.executable, '-m', 'bench.cs2ss_memory',
+                                   '--child', variant, '--file', filename,
+                                   '--rows', str(args.rows)])
+    finally:
+        os.remove(filename)
+
+
+if __name__ == "__main__":
+    main()
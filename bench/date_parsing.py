@@ -0,0 +1,93 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# date_parsing.py: strptime vs the cached date parsers used by the
+# importers (cfd.util.parse_ref_date, eto.util.parse_ref_datetime).
+#
+#   python -m bench.date_parsing --rows 1000000 --dates 300
+#
+
+from __future__ import division, print_function
+import sys
+import time
+import random
+import argparse
+import datetime
+
+sys.path.insert(0, '.')
+import cfd.util
+import eto.util
+
+
+def strptime_cfd(s):
+    return datetime.datetime.strptime(s, '%d/%m/%y').date()
+
+
+def strptime_eto(s):
+    return datetime.datetime.strptime(s, '%d/%m/%Y %I:%M:%S %p')
+
+
+def make_strings(rows, dates, seed=1):
+    rnd = random.Random(seed)
+    start = datetime.date(2008, 7, 1)
+    days = [start + datetime.timedelta(days=rnd.randint(0, 2000))
+            for i in range(dates)]
+    cfd_dates = []
+    eto_dates = []
+    for i in range(rows):
+        d = rnd.choice(days)
+        t = datetime.datetime(d.year, d.month, d.day, rnd.randint(9, 15),
+                              rnd.randint(0, 59), rnd.randint(0, 59))
+        cfd_dates.append(d.strftime('%d/%m/%y'))
+        eto_dates.append(t.strftime('%d/%m/%Y %I:%M:%S %p'))
+    return cfd_dates, eto_dates
+
+
+def timed(func, strings):
+    start = time.time()
+    for s in strings:
+        func(s)
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='date parsing benchmark')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--dates', type=int, default=300,
+                        help='number of distinct dates (default %(default)d)')
+    args = parser.parse_args()
+
+    cfd_dates, eto_dates = make_strings(args.rows, args.dates)
+    print('%d rows, %d distinct dates' % (args.rows, args.dates))
+    print('%-28s %10s %10s %8s' % ('format', 'strptime', 'new', 'speedup'))
+    for name, strings, old, new, cache in (
+            ('cfd %d/%m/%y', cfd_dates, strptime_cfd,
+             cfd.util.parse_ref_date, cfd.util._ref_date_cache),
+            ('eto %d/%m/%Y %I:%M:%S %p', eto_dates, strptime_eto,
+             eto.util.parse_ref_datetime, eto.util._ref_date_cache)):
+        cache.clear()
+        old_secs = timed(old, strings)
+        new_secs = timed(new, strings)
+        print('%-28s %9.2fs %9.2fs %7.1fx' %
+              (name, old_secs, new_secs, old_secs / new_secs))
+
+
+if __name__ == "__main__":
+    main()
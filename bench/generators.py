@@ -0,0 +1,241 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# generators.py: synthetic input data.
+#
+# Generators yield rows (lists of strings) in the same layout as the real
+# input files, and are deterministic for a given seed.
+#
+
+from __future__ import division, print_function
+import csv
+import random
+import decimal
+import datetime
+
+
+# Dates advance more slowly for bigger files, so they cover at most about
+# SPAN_DAYS whatever the row count.
+SPAN_DAYS = 20 * 365
+
+
+def day_step_chance(count):
+    ''' Chance of moving on to the next day after each row.'''
+    return min(0.5, SPAN_DAYS / max(count, 1))
+
+
+def make_symbols(count):
+    ''' List of count made up 3 letter stock codes.'''
+    symbols = []
+    for i in range(count):
+        symbols.append(chr(65 + (i // 676) % 26) + chr(65 + (i // 26) % 26) +
+                       chr(65 + i % 26))
+    return symbols
+
+
+def commsec_rows(count, symbols=50, partial_ratio=0.0, seed=1):
+    '''
+    CommSec contract note rows, as read by cs2ss.py (header row first):
+
+        ID, DATE, TYPE, SYMBOL, QTY, PRICE, BROKERAGE, TOTAL
+
+    partial_ratio is the fraction of positions sold in two parcels.  The
+    header is not included in count.
+    '''
+    rnd = random.Random(seed)
+    codes = make_symbols(symbols)
+    step = day_step_chance(count)
+    yield ['ID', 'Date', 'Type', 'Security', 'Quantity', 'Price',
+           'Brokerage', 'Total']
+    day = datetime.date(2008, 7, 1)
+    open_pos = {}   # symbol --> [quantity left, price, partial?]
+    n = 0
+    while n < count:
+        if rnd.random() < step:
+            day += datetime.timedelta(days=1)
+        sym = rnd.choice(codes)
+        if sym in open_pos:
+            qty, price, partial = open_pos[sym]
+            sell = qty // 2 if partial else qty
+            if sell == qty:
+                del open_pos[sym]
+            else:
+                open_pos[sym] = [qty - sell, price, False]
+            price = round(price * rnd.uniform(0.8, 1.25), 3)
+            total = sell * price - 19.95
+            row_type = 'Sell'
+            qty = sell
+        else:
+            qty = rnd.randint(1, 50) * 100
+            price = rnd.randint(10, 5000) / 100
+            open_pos[sym] = [qty, price, rnd.random() < partial_ratio]
+            total = qty * price + 19.95
+            row_type = 'Buy'
+        n += 1
+        yield ['C%08d' % n, day.strftime('%d/%m/%Y'), row_type, sym, str(qty),
+               '%.3f' % price, '19.95', '%.2f' % total]
+
+
+IG_SYMBOLS = ['BHP Billiton', 'Rio Tinto', 'Australia 200 Cash', 'Woolworths',
+              'Telstra']
+
+IG_CASH = [('DEPO', 'BPAY deposit'), ('WITH', 'EFT payment sent'),
+           ('EXCHANGE', 'ASX data'), ('WITH', 'BHP LONG INT'),
+           ('DEPO', 'XYZ SHORT INT'), ('DIVIDEND', 'BHP div'),
+           ('DEPO', 'DVDA adj'), ('WITH', 'Transfer from A to B at 1.0'),
+           ('WITH', 'misc'), ('DEPO', 'Asx fee refund')]
+
+
+def ig_symbols(count):
+    ''' IG_SYMBOLS (one of them an index), then made up companies.'''
+    names = IG_SYMBOLS[:count]
+    names.extend('%s Ltd' % code for code in make_symbols(count - len(names)))
+    return names
+
+
+def ig_rows(count, symbols=5, partial_ratio=0.2, seed=1):
+    '''
+    IG transaction file rows, as read by cfd-import.py (no header):
+
+        TYPE DATE REF DESC PERIOD OPEN CURRENCY SIZE CLOSE AMOUNT
+
+    Each position has a commission (and sometimes a risk premium) row when
+    opened, and a commission and DEAL row for each close.  partial_ratio
+    is the fraction of positions closed in two parcels.  Cash transactions
+    (interest, dividends, transfers, fees) are mixed in.
+    '''
+    rnd = random.Random(seed)
+    names = ig_symbols(symbols)
+    step = day_step_chance(count)
+    day = datetime.date(2008, 6, 1)
+    open_pos = []
+    k = 0
+    n = 0
+    while n < count:
+        if rnd.random() < step:
+            day += datetime.timedelta(days=1)
+        ds = day.strftime('%d/%m/%y')
+        r = rnd.random()
+        k += 1
+        if r < 0.35 or not open_pos:
+            ref = 'DIA%08d' % k
+            sym = rnd.choice(names)
+            price = rnd.randint(100, 5000) / 100
+            size = rnd.randint(1, 20) * 100
+            open_pos.append([ref, sym, price, size,
+                             rnd.random() < partial_ratio])
+            rows = [['WITH', ds, 'C%08d' % k,
+                     '%s COMM %s' % (sym.split()[0], ref), '-', '0', 'A$',
+                     '0', '0', '-%.2f' % (size * price * 0.001 + 8)]]
+            if rnd.random() < 0.1:
+                rows.append(['WITH', ds, 'R%08d' % k,
+                             '%s CRPREM %s' % (sym.split()[0], ref), '-',
+                             '0', 'A$', '0', '0',
+                             '-%.2f' % rnd.uniform(1, 5)])
+        elif r < 0.75:
+            p = rnd.choice(open_pos)
+            ref, sym, price, size, partial = p
+            close = rnd.randint(100, 5000) / 100
+            part = size // 2 if partial and size >= 200 else size
+            mult = 5 if sym.startswith('Australia') else 1
+            # Prices before December 2008 are in cents.
+            scale = 100 if day < datetime.date(2008, 12, 1) else 1
+            rows = [['WITH', ds, 'C%08d' % k,
+                     '%s COMM %s' % (sym.split()[0], ref), '-', '0', 'A$',
+                     '0', '0', '-%.2f' % (part * close * 0.001 + 8)],
+                    ['DEAL', ds, ref, sym, '-', '%.2f' % (price * scale),
+                     'A$', str(part), '%.2f' % (close * scale),
+                     '%.2f' % ((close - price) * part * mult)]]
+            if part == size:
+                open_pos.remove(p)
+            else:
+                p[3] = size - part
+                p[4] = False
+        else:
+            t = rnd.choice(IG_CASH)
+            rows = [[t[0], ds, 'X%08d' % k, t[1], '-', '0', 'A$', '0', '0',
+                     '%.2f' % rnd.uniform(-100, 100)]]
+        for row in rows[:count - n]:
+            n += 1
+            yield row
+
+
+def eto_rows(count, symbols=40, partial_ratio=0.3, seed=1):
+    '''
+    Option activity rows, as read by eto-import.py (dates already
+    converted to DD/MM/YYYY, no header):
+
+        Symbol, Description, Action, Quantity, Price, Commission, Reg Fees,
+        Date, TransactionID, Order Number, Transaction Type ID, Total Cost
+
+    symbols is the number of underlyings (each has calls and puts).
+    partial_ratio is the fraction of trades closed in two parcels.  Totals
+    pass the Net/Gross check.  The last rows close any trades still open.
+    '''
+    rnd = random.Random(seed)
+    D = decimal.Decimal
+    max_minutes = max(2, min(600, int(2 * SPAN_DAYS * 24 * 60 / max(count, 1))))
+    t = datetime.datetime(2009, 1, 5, 9, 30)
+    open_pos = []
+    k = 0
+    u = 0
+    while k < count:
+        t += datetime.timedelta(minutes=rnd.randint(1, max_minutes))
+        # Leave enough rows to close everything.
+        closing = count - k <= len(open_pos) + 1
+        if not open_pos or (not closing and rnd.random() < 0.45):
+            u += 1
+            sym = 'SYM%d %s' % (rnd.randint(1, symbols), 'C' if u % 2 else 'P')
+            if any(p[0] == sym for p in open_pos):
+                continue
+            qty = rnd.randint(1, 10)
+            action = 'Buy To Open'
+            price = D(rnd.randint(5, 900)) / 100
+            open_pos.append([sym, qty, qty > 1 and rnd.random() < partial_ratio])
+        else:
+            p = rnd.choice(open_pos)
+            sym, left, partial = p
+            qty = left // 2 if partial and not closing else left
+            action = 'Sell To Close'
+            # Not so low that brokerage makes the total negative.
+            price = D(rnd.randint(20, 900)) / 100
+            if qty == left:
+                open_pos.remove(p)
+            else:
+                p[1] = left - qty
+                p[2] = False
+        k += 1
+        comm = D('9.99') + D(qty) * D('0.75')
+        fees = D('0.0%d' % rnd.randint(1, 9))
+        gross = D(qty) * 100 * price
+        if action == 'Buy To Open':
+            total = '-' + str(gross + comm + fees)
+        else:
+            total = str(gross - comm - fees)
+        yield [sym, sym + ' option', action, str(qty), str(price), str(comm),
+               str(fees), t.strftime('%d/%m/%Y %I:%M:%S %p'), 'T%d' % k,
+               'O%d' % k, '1', total]
+
+
+def write_csv(filename, rows):
+    with open(filename, 'wb') as f:
+        writer = csv.writer(f)
+        for row in rows:
+            writer.writerow(row)
@@ -0,0 +1,110 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# logging_overhead.py: cost of the logging calls made per row by the
+# importers and processors, with the old logging set up (everything at
+# DEBUG, written as logged) and with eto.util.init_logging().
+#
+#   python -m bench.logging_overhead --rows 200000
+#
+# One row is a debug message, plus a repeated warning every --warn-every
+# rows.  Each setup runs in its own process, with the console discarded,
+# and is timed until everything has been written to the log file.
+#
+
+from __future__ import division, print_function
+import os
+import sys
+import time
+import atexit
+import logging
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, '.')
+
+
+SETUPS = ['old', 'sync-debug', 'thread-debug', 'sync-info', 'thread-info']
+
+
+def old_logging(filename):
+    formatter = logging.Formatter('%(levelname)s:\t%(message)s\t[%(name)s]')
+    for h in (logging.StreamHandler(), logging.FileHandler(filename)):
+        h.setFormatter(formatter)
+        logging.getLogger().addHandler(h)
+    logging.getLogger().setLevel(logging.DEBUG)
+
+
+def child(setup, rows, warn_every, filename):
+    from eto.util import init_logging
+    start = time.time()
+    # Registered first so it runs last, after the log writer has finished.
+    atexit.register(lambda: print('%.3f' % (time.time() - start)))
+    if setup == 'old':
+        old_logging(filename)
+    else:
+        init_logging(logging.INFO if setup.endswith('-info') else logging.DEBUG,
+                     filename, setup.startswith('thread'))
+    logger = logging.getLogger('bench')
+    for i in range(rows):
+        logger.debug("OPENING OPTION TRADE: %s %s", 'SYM%d C' % (i % 40),
+                     'option')
+        if i % warn_every == 0:
+            logger.warn("FOUND %d COMMISSIONS FOR %s (%s)", 3,
+                        'DIA%08d' % i, 'option')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='logging overhead benchmark')
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--warn-every', type=int, default=50)
+    parser.add_argument('--child', choices=SETUPS, help=argparse.SUPPRESS)
+    parser.add_argument('--log-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.rows, args.warn_every, args.log_file)
+        return
+
+    log_dir = tempfile.mkdtemp(prefix='th-bench-')
+    print('%d rows, warning every %d' % (args.rows, args.warn_every))
+    print('%-14s %9s %10s %10s' % ('setup', 'seconds', 'us/row', 'log lines'))
+    try:
+        for setup in SETUPS:
+            filename = os.path.join(log_dir, setup + '.log')
+            with open(os.devnull, 'w') as devnull:
+                out = subprocess.check_output(
+                    [sys.executable, '-m', 'bench.logging_overhead',
+                     '--child', setup, '--rows', str(args.rows),
+                     '--warn-every', str(args.warn_every),
+                     '--log-file', filename], stderr=devnull)
+            secs = float(out.split()[-1])
+            with open(filename) as f:
+                lines = sum(1 for line in f)
+            print('%-14s %8.2fs %10.1f %10d' % (setup, secs,
+                  secs * 1e6 / args.rows, lines))
+    finally:
+        for name in os.listdir(log_dir):
+            os.remove(os.path.join(log_dir, name))
+        os.rmdir(log_dir)
+
+
+if __name__ == "__main__":
+    main()
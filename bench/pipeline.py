@@ -0,0 +1,213 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# pipeline.py: time each stage of the cfd, eto and cs2ss pipelines
+# (create, import, categorise, process, export) on synthetic data, at one
+# or more row counts.
+#
+# Each TREE is a git revision, or . for the working tree, and gets its own
+# copy and databases, so versions can be compared, e.g.
+#
+#   python -m bench.pipeline --rows 10000 100000 HEAD~1 .
+#
+# Results are also written (one record per tree/pipeline/rows/stage) to a
+# JSON file, --results.
+#
+
+from __future__ import division, print_function
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import datetime
+import tempfile
+import subprocess
+
+sys.path.insert(0, '.')
+from bench.generators import ig_rows, eto_rows, commsec_rows, write_csv
+
+
+# pipeline --> (generator, input file name, stages).  Stage commands are
+# run from the tree's directory; {input} is the generated input file.
+PIPELINES = {
+    'cfd': (ig_rows, 'ig.csv', [
+        ('create', ['cfd-create-db.py']),
+        ('import', ['cfd-import.py', '{input}']),
+        ('categorise', ['cfd-categorise.py']),
+        ('process', ['cfd-process.py']),
+        ('export', ['cfd-csv-export.py', 'cfd_out']),
+    ]),
+    'eto': (eto_rows, 'eto.csv', [
+        ('create', ['eto-create-db.py']),
+        ('import', ['eto-import.py', '{input}']),
+        ('process', ['eto-process.py']),
+        ('export', ['eto-csv-export.py', 'eto_out']),
+    ]),
+    # cs2ss.py always reads csin.csv.
+    'cs2ss': (commsec_rows, 'csin.csv', [
+        ('process', ['cs2ss.py']),
+    ]),
+}
+
+DEFAULT_ROWS = [10000, 100000, 1000000]
+
+
+def checkout(tree, dest):
+    ''' Copy of the scripts at a git revision, or the working tree.'''
+    if tree == '.':
+        shutil.copytree('.', dest, ignore=shutil.ignore_patterns(
+                        '.git', '*.db', '*.db-*', '*.whl', '*.pyc'))
+        return
+    os.mkdir(dest)
+    archive = subprocess.Popen(['git', 'archive', tree], stdout=subprocess.PIPE)
+    subprocess.check_call(['tar', '-x', '-C', dest], stdin=archive.stdout)
+    if archive.wait():
+        sys.exit("git archive %s failed" % tree)
+
+
+def describe(tree):
+    ''' Commit id of tree (with "+" if the working tree has changes).'''
+    try:
+        rev = 'HEAD' if tree == '.' else tree
+        commit = subprocess.check_output(['git', 'rev-parse', rev]).strip()
+        if tree == '.' and subprocess.call(['git', 'diff', '--quiet', 'HEAD']):
+            commit += '+'
+        return commit.decode('ascii')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_stages(tree_dir, stages, input_name):
+    ''' Returns list of (stage, seconds).'''
+    results = []
+    log_name = os.path.join(tree_dir, 'bench.log')
+    with open(log_name, 'a') as log:
+        for name, cmd in stages:
+            cmd = [arg.format(input=input_name) for arg in cmd]
+            log.write('\n*** %s\n' % ' '.join(cmd))
+            log.flush()
+            start = time.time()
+            rc = subprocess.call([sys.executable] + cmd, cwd=tree_dir,
+                                 stdout=log, stderr=subprocess.STDOUT)
+            if rc:
+                log.close()
+                sys.stderr.writelines(open(log_name).readlines()[-20:])
+                sys.exit("%s failed" % ' '.join(cmd))
+            results.append((name, time.time() - start))
+    return results
+
+
+def print_table(records, trees):
+    for rows in sorted(set(r['rows'] for r in records)):
+        print()
+        print('%d rows' % rows)
+        print('%-18s' % 'stage' + ''.join('%14s' % t for t in trees))
+        keys = []
+        for r in records:
+            key = (r['pipeline'], r['stage'])
+            if r['rows'] == rows and key not in keys:
+                keys.append(key)
+        for key in keys:
+            line = '%-18s' % ' '.join(key)
+            for tree in trees:
+                secs = [r['seconds'] for r in records
+                        if (r['tree'], r['rows'], r['pipeline'], r['stage'])
+                        == (tree, rows) + key]
+                line += '%13.2fs' % secs[0] if secs else '%14s' % '-'
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='trade-herder pipeline benchmark')
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS,
+                        help='input file sizes (default %s)' %
+                        ' '.join(str(n) for n in DEFAULT_ROWS))
+    parser.add_argument('--pipeline', nargs='+', choices=sorted(PIPELINES),
+                        default=['cfd', 'eto', 'cs2ss'],
+                        help='pipelines to run (default all)')
+    parser.add_argument('--symbols', type=int,
+                        help='number of symbols (default: per generator)')
+    parser.add_argument('--partial-ratio', type=float,
+                        help='fraction of positions closed in two parcels '
+                        '(default: per generator)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--results', default='bench-results.json',
+                        help='JSON results file (default %(default)s)')
+    parser.add_argument('--keep', action='store_true',
+                        help="don't delete the working directory")
+    parser.add_argument('TREE', nargs='*', default=['.'],
+                        help='git revision, or . for the working tree')
+    args = parser.parse_args()
+
+    gen_args = {'seed': args.seed}
+    if args.symbols is not None:
+        gen_args['symbols'] = args.symbols
+    if args.partial_ratio is not None:
+        gen_args['partial_ratio'] = args.partial_ratio
+
+    work_dir = tempfile.mkdtemp(prefix='th-bench-')
+    records = []
+    try:
+        tree_dirs = []
+        for i, tree in enumerate(args.TREE):
+            tree_dirs.append(os.path.join(work_dir, 'tree%d' % i))
+            checkout(tree, tree_dirs[-1])
+        for rows in args.rows:
+            for pipeline in args.pipeline:
+                generate, input_name, stages = PIPELINES[pipeline]
+                data_file = os.path.join(work_dir, input_name)
+                write_csv(data_file, generate(rows, **gen_args))
+                for tree, tree_dir in zip(args.TREE, tree_dirs):
+                    shutil.copy(data_file, os.path.join(tree_dir, input_name))
+                    for stage, secs in run_stages(tree_dir, stages, input_name):
+                        records.append({'tree': tree, 'pipeline': pipeline,
+                                        'rows': rows, 'stage': stage,
+                                        'seconds': round(secs, 3)})
+                    print('%s %s %d rows: %.2fs' % (
+                          tree, pipeline, rows,
+                          sum(r['seconds'] for r in records
+                              if (r['tree'], r['pipeline'], r['rows']) ==
+                              (tree, pipeline, rows))))
+                    sys.stdout.flush()
+    finally:
+        if args.keep:
+            print('Working directory:', work_dir)
+        else:
+            shutil.rmtree(work_dir)
+
+    print_table(records, args.TREE)
+    with open(args.results, 'w') as f:
+        json.dump({
+            'date': datetime.datetime.now().isoformat(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'trees': dict((t, describe(t)) for t in args.TREE),
+            'generator': gen_args,
+            'results': records,
+        }, f, indent=1, sort_keys=True)
+    print()
+    print('Results written to', args.results)
+
+
+if __name__ == "__main__":
+    main()
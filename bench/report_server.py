@@ -0,0 +1,246 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# report_server.py: time the reports run as scripts (a new process each
+# time) against the same reports from report-server.py, on generated cfd
+# and eto databases, e.g.
+#
+#   python -m bench.report_server --rows 100000
+#
+# Server times are for the first request after it starts (loading the
+# cache), the first request for a date range with the cache loaded, the
+# best of --repeat requests after that (the response is cached too), and a
+# request after another process has committed (loading it all again,
+# which is checked in the server's /status).
+#
+# Every response timed is also checked against the script's output for the
+# same dates (what it prints, or the file it writes), and the responses for
+# all dates must change after each commit.
+#
+
+from __future__ import division, print_function
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import urllib2
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, '.')
+from bench.generators import ig_rows, eto_rows, write_csv
+from bench.pipeline import PIPELINES, checkout, run_stages
+
+
+# Date ranges, as script arguments and query strings.
+RANGES = [([], ''),
+          (['--fyau', '2009'], 'fyau=2009'),
+          (['--fyau', '2010'], 'fyau=2010'),
+          (['--start', '2009-02-01', '--end', '2009-02-28'],
+           'start=2009-02-01&end=2009-02-28')]
+
+# report --> (script command, [(server path, script output)]), where the
+# output is a file written by the script, or None for what it prints.
+REPORTS = [
+    ('cfd-report', ['cfd-report.py'], [('/cfd/report', None)]),
+    ('cfd-csv-export', ['cfd-csv-export.py', 'cfd_out'],
+     [('/cfd/summary', None),
+      ('/cfd/div.csv', 'cfd_out/div.csv'),
+      ('/cfd/longint.csv', 'cfd_out/longint.csv'),
+      ('/cfd/shortint.csv', 'cfd_out/shortint.csv'),
+      ('/cfd/unknown.csv', 'cfd_out/unknown.csv'),
+      ('/cfd/trade.csv', 'cfd_out/trade.csv')]),
+    ('eto-csv-export', ['eto-csv-export.py', 'eto_out'],
+     [('/eto/summary', None),
+      ('/eto/raw_events.csv', 'eto_out_raw_events.csv'),
+      ('/eto/format_events.csv', 'eto_out_format_events.csv')]),
+]
+
+# Lines cfd-csv-export.py prints about its output directory, which aren't
+# part of the summary.
+DIRECTORY_LINES = ('Using directory ', 'Creating output directory ')
+
+# Commits to each database while the server is running (adding data, so
+# the reports change).
+COMMITS = {'cfd': [['cfd-import.py', 'more.csv']],
+           'eto': [['eto-import.py', 'more_eto.csv'], ['eto-process.py']]}
+
+
+def free_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def best_time(func, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def run_script(tree_dir, cmd):
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call([sys.executable] + cmd, cwd=tree_dir,
+                              stdout=devnull, stderr=devnull)
+
+
+def fetch(port, paths, query):
+    return [urllib2.urlopen('http://127.0.0.1:%d%s?%s' %
+                            (port, path, query)).read()
+            for path in paths]
+
+
+def script_outputs(tree_dir, cmd, outputs):
+    ''' Run a report script once, and return what it printed or wrote for
+    each of outputs.'''
+    with open(os.devnull, 'w') as devnull:
+        printed = subprocess.check_output([sys.executable] + cmd,
+                                          cwd=tree_dir, stderr=devnull)
+    printed = ''.join(line for line in printed.splitlines(True)
+                      if not line.startswith(DIRECTORY_LINES))
+    results = []
+    for output in outputs:
+        if output is None:
+            results.append(printed)
+        else:
+            with open(os.path.join(tree_dir, output), 'rb') as f:
+                results.append(f.read())
+    return results
+
+
+def check_responses(tree_dir, port, cmd, routes, query):
+    ''' Exit unless the server's responses match a new run of the script.'''
+    paths = [path for path, output in routes]
+    expected = script_outputs(tree_dir, cmd,
+                              [output for path, output in routes])
+    for path, body, script in zip(paths, fetch(port, paths, query), expected):
+        if body != script:
+            sys.exit("%s?%s doesn't match %s" % (path, query, ' '.join(cmd)))
+
+
+def server_status(port, db):
+    url = 'http://127.0.0.1:%d/status' % port
+    return json.loads(urllib2.urlopen(url).read())[db]
+
+
+def wait_for_server(port, proc):
+    while True:
+        if proc.poll() is not None:
+            sys.exit("report-server.py failed")
+        try:
+            urllib2.urlopen('http://127.0.0.1:%d/status' % port).read()
+            return
+        except urllib2.URLError:
+            time.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='report server benchmark')
+    parser.add_argument('--rows', type=int, default=100000,
+                        help='rows of cfd and eto data (default %(default)d)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs of each warm request/script (default %(default)d)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='th-bench-')
+    tree_dir = os.path.join(work_dir, 'tree')
+    server = None
+    try:
+        checkout('.', tree_dir)
+        for pipeline, generate in (('cfd', ig_rows), ('eto', eto_rows)):
+            input_name = PIPELINES[pipeline][1]
+            write_csv(os.path.join(tree_dir, input_name),
+                      generate(args.rows, seed=args.seed))
+            stages = [s for s in PIPELINES[pipeline][2] if s[0] != 'export']
+            run_stages(tree_dir, stages, input_name)
+        # Small files to import while the server is running.
+        write_csv(os.path.join(tree_dir, 'more.csv'),
+                  ig_rows(100, seed=args.seed + 1))
+        write_csv(os.path.join(tree_dir, 'more_eto.csv'),
+                  eto_rows(100, seed=args.seed + 1))
+
+        port = free_port()
+        with open(os.path.join(tree_dir, 'server.log'), 'w') as log:
+            server = subprocess.Popen([sys.executable, 'report-server.py',
+                                       '--port', str(port)], cwd=tree_dir,
+                                      stdout=log, stderr=subprocess.STDOUT)
+        wait_for_server(port, server)
+
+        print('%d rows, times in seconds' % args.rows)
+        print('%-16s %-32s %8s %8s %8s %8s %8s' % ('report', 'dates', 'script',
+              'first', 'range', 'repeat', 'reload'))
+        loaded = set()
+        for name, cmd, routes in REPORTS:
+            db = name.split('-')[0]
+            paths = [path for path, output in routes]
+            for script_args, query in RANGES:
+                request = lambda: fetch(port, paths, query)
+                script = best_time(lambda: run_script(tree_dir,
+                                   cmd + script_args), args.repeat)
+                times = ['-'] * 4
+                if db not in loaded:
+                    # The first request for a database loads its cache.
+                    times[0] = best_time(request, 1)
+                    loaded.add(db)
+                else:
+                    times[1] = best_time(request, 1)
+                # Then the response is cached.
+                times[2] = best_time(request, args.repeat)
+                if not query:
+                    # And it's all loaded again after a commit.
+                    before = server_status(port, db)
+                    old_bodies = fetch(port, paths, query)
+                    for commit in COMMITS[db]:
+                        run_script(tree_dir, commit)
+                    times[3] = best_time(request, 1)
+                    after = server_status(port, db)
+                    if (after['invalidations'] <= before['invalidations'] or
+                            after['loads'] <= before['loads']):
+                        sys.exit("%s wasn't reloaded after %s" %
+                                 (db, COMMITS[db][0][0]))
+                    if fetch(port, paths, query) == old_bodies:
+                        sys.exit("%s responses didn't change after %s" %
+                                 (name, COMMITS[db][0][0]))
+                check_responses(tree_dir, port, cmd + script_args, routes,
+                                query)
+                print('%-16s %-32s %8.3f' % (name, query or 'all', script) +
+                      ''.join('%9.3f' % t if t != '-' else '%9s' % t
+                              for t in times))
+                sys.stdout.flush()
+    finally:
+        if server is not None and server.poll() is None:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# startup.py: cold start time of each script (running it with --help), run
+# directly and through trade-herder.py, for git revisions and/or the
+# working tree, e.g.
+#
+#   python -m bench.startup HEAD~1 .
+#
+# Times are the best of --repeat runs, in milliseconds.
+#
+
+from __future__ import division, print_function
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, '.')
+from bench.pipeline import checkout
+
+
+# Scripts with command line options (the others just start working).
+SCRIPTS = ['cfd-import.py', 'cfd-categorise.py', 'cfd-process.py',
+           'cfd-report.py', 'cfd-csv-export.py', 'cfd-migrate-db.py',
+           'eto-import.py', 'eto-process.py', 'eto-csv-export.py',
+           'eto-migrate-db.py', 'csv_us2au_date.py']
+
+ENTRY_POINT = 'trade-herder.py'
+
+
+def best_time(cmd, cwd, repeat):
+    best = None
+    with open(os.devnull, 'w') as devnull:
+        for i in range(repeat):
+            start = time.time()
+            subprocess.check_call(cmd, cwd=cwd, stdout=devnull,
+                                  stderr=devnull)
+            elapsed = time.time() - start
+            if best is None or elapsed < best:
+                best = elapsed
+    return best
+
+
+def commands(tree_dir):
+    ''' List of (name, command line) to time in tree_dir.'''
+    result = [('python', [sys.executable, '-c', 'pass']),
+              ('import cfd.models',
+               [sys.executable, '-c', 'import cfd.models']),
+              ('import eto.models',
+               [sys.executable, '-c', 'import eto.models'])]
+    has_entry = os.path.exists(os.path.join(tree_dir, ENTRY_POINT))
+    if has_entry:
+        result.append(('trade-herder --help',
+                       [sys.executable, ENTRY_POINT, '--help']))
+    for script in SCRIPTS:
+        name = os.path.splitext(script)[0]
+        result.append((name + ' --help', [sys.executable, script, '--help']))
+        if has_entry:
+            result.append(('  via trade-herder',
+                           [sys.executable, ENTRY_POINT,
+                            name.replace('_', '-'), '--help']))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='trade-herder startup benchmark')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='runs of each command (default %(default)d)')
+    parser.add_argument('TREE', nargs='*', default=['.'],
+                        help='git revision, or . for the working tree')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='th-bench-')
+    try:
+        # name --> {tree: seconds}, in the order first seen
+        names = []
+        times = {}
+        for i, tree in enumerate(args.TREE):
+            tree_dir = os.path.join(work_dir, 'tree%d' % i)
+            checkout(tree, tree_dir)
+            for name, cmd in commands(tree_dir):
+                key = (name, cmd[-2] if name.startswith(' ') else None)
+                if key not in times:
+                    names.append((key, name))
+                    times[key] = {}
+                times[key][tree] = best_time(cmd, tree_dir, args.repeat)
+    finally:
+        shutil.rmtree(work_dir)
+
+    print('%-28s' % 'command (ms)' + ''.join('%12s' % t for t in args.TREE))
+    for key, name in names:
+        print('%-28s' % name + ''.join(
+              '%12.0f' % (times[key][t] * 1000) if t in times[key]
+              else '%12s' % '-' for t in args.TREE))
+
+
+if __name__ == "__main__":
+    main()
@@ -26,43 +26,58 @@ from __future__ import division, unicode_literals, print_function
 import os.path
 import sys
 import re
-import sqlalchemy
+import time
+import argparse
 sys.path.insert(0, '.')
 
-from cfd.models import get_session, RawData, ModelsError
+from cfd.config import g_config
+from cfd import sqlstats
 
 
-def categorise():
+@sqlstats.stage('categorise')
+def categorise(rules, incremental=False):
     session = get_session()
-    for i in session.query(RawData):
-        if i.type == "DEAL":
-            if (re.match(r'Australia\s*200', i.description, re.IGNORECASE)):
-                i.category = RawData.CAT_INDEX
-            else:
-                i.category = RawData.CAT_TRADE
-        elif i.type == "DEPO" and "BPAY" in i.description.upper():
-            i.category = RawData.CAT_TRANSFER
-        elif i.type == "WITH" and "eft payment sent" in i.description.lower():
-            i.category = RawData.CAT_TRANSFER
-        elif (   i.type == "EXCHANGE"  
-              or "ASX FEE" in i.description.upper()
-              or re.search(r'Transfer from.*to.*at', i.description, re.IGNORECASE)):
-            i.category = RawData.CAT_XFEE
-        elif (i.type == "WITH" and "LONG INT" in i.description.upper()):
-            i.category = RawData.CAT_INTEREST
-        elif (i.type == "DEPO" and "SHORT INT" in i.description.upper()):
-            i.category = RawData.CAT_INTEREST
-        elif (i.type == "WITH" and " COMM " in i.description.upper()):
-            i.category = RawData.CAT_COMM
-        elif (i.type == "WITH" and " CRPREM " in i.description.upper()):
-            i.category = RawData.CAT_RISK
-        elif (   i.type == "DIVIDEND"  
-              or re.match(r'DVD[A-Z]', i.description, re.IGNORECASE)):
-            i.category = RawData.CAT_DIVIDEND
-        else:
-            i.category = RawData.CAT_UNKNOWN
+    q = session.query(RawData.id, RawData.type, RawData.description,
+                      RawData.category)
+    if incremental:
+        q = q.filter(RawData.category==RawData.CAT_UNKNOWN)
+    rows = q.all()
+    if not rows:
+        return
+    ids, types, descriptions, current = zip(*rows)
+    start_time = time.time()
+    categories = rules.categorise_columns(types, descriptions)
+    elapsed = time.time() - start_time
 
+    changes = [{'b_id': ids[k], 'b_category': categories[k]}
+               for k in range(len(ids)) if categories[k] != current[k]]
+    if changes:
+        t = RawData.__table__
+        stmt = t.update().where(t.c.id==sqlalchemy.bindparam('b_id')).values(
+                                category=sqlalchemy.bindparam('b_category'))
+        session.execute(stmt, changes)
     session.commit()
+    print("Categorised %d entries (%d changed), rules took %.3f seconds." %
+          (len(ids), len(changes), elapsed))
 
 if __name__ ==  "__main__":
-    categorise()
+    parser = argparse.ArgumentParser(description='cfd-categorise: Categorise raw transaction data')
+    parser.add_argument('--rules', default=g_config.category_rules_file,
+                        help='categorisation rules file (default %(default)s)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only categorise entries not already categorised')
+    parser.add_argument('--sql-stats', action='store_true',
+                        help='report SQL statements, rows and time per stage '
+                        '(same as setting %s=1)' % sqlstats.ENV_VAR)
+    args = parser.parse_args()
+    # Load the models (and SQLAlchemy) only once the arguments are OK.
+    import sqlalchemy
+    from cfd.models import get_session, RawData, enable_sql_stats
+    from cfd.rules import load_rules, RulesError
+    if args.sql_stats:
+        enable_sql_stats()
+    try:
+        rules = load_rules(args.rules)
+    except RulesError as e:
+        sys.exit(e.msg)
+    categorise(rules, args.incremental)
@@ -21,51 +21,179 @@
 #
 #  cfd-import.py
 #
+#  Input can be several files, directories (all *.csv files in them) or
+#  glob patterns.  With more than one file, files are parsed in parallel
+#  (--jobs), but imported in the order given, in one transaction.
+#
 
 from __future__ import division, unicode_literals, print_function
-import os.path
 import sys
+import decimal
+import argparse
+import importlib
+import collections
+import multiprocessing
 sys.path.insert(0, '.')
 
-import sqlalchemy
-import csv
+import cfd.config
+from cfd import sqlstats
+from cfd.importfile import input_files, parsed_files
+
+
+class ImportFileError(Exception):
+    ''' Bad row in an input file.'''
+    def __init__(self, filename, line_num, row, msg):
+        Exception.__init__(self, filename, line_num, row, msg)
+        self.filename = filename
+        self.line_num = line_num
+        self.row = row
+        self.msg = msg
+
+
+def import_error(e):
+    print("****** IMPORT ERROR AT LINE %d OF %s" % (e.line_num, e.filename))
+    print("****** ", e.msg)
+    print(e.row)
+
+
+def parse_row(filename, line_num, row):
+    ''' RawData.parse_list() tuple (with import_id 0) for a row.  Raises
+    ImportFileError if it can't be parsed (bad date, number, missing
+    fields).'''
+    try:
+        return cfd.models.RawData.parse_list(row)
+    except cfd.models.ModelsError as e:
+        raise ImportFileError(filename, line_num, row, e.msg)
+    except (ValueError, IndexError, decimal.InvalidOperation) as e:
+        raise ImportFileError(filename, line_num, row, str(e))
+
+
+def parsed_rows(files, jobs):
+    ''' All parsed rows, in file order.'''
+    for filename, rows in parsed_files(files, jobs, parse_row):
+        print("Using input file:", filename)
+        for values in rows:
+            yield values
+
+
+class ImportDedupe(object):
+    ''' Used for incremental imports, to skip rows that are already in
+    stock_raw (e.g. from an overlapping statement file).  Rows are matched
+    on broker ref, date and amount.  Each existing row cancels out at most
+    one new row, so genuinely repeated rows in the new file still get
+    imported.'''
+
+    def __init__(self, session):
+        RawData = cfd.models.RawData
+        q = session.query(RawData.broker_ref, RawData.ref_date, RawData.amount)
+        self.existing = collections.Counter(tuple(r) for r in q)
+        self.skipped = 0
 
-import cfd.models
+    def is_duplicate(self, broker_ref, ref_date, amount):
+        key = (broker_ref, ref_date, decimal.Decimal(amount))
+        if self.existing[key] > 0:
+            self.existing[key] -= 1
+            self.skipped += 1
+            return True
+        return False
+
+
+@sqlstats.stage('import')
+def import_orm(session, rows, first_id=0, dedupe=None):
+    ''' Import parsed rows one RawData object at a time.  Returns number of
+    rows added to the session.'''
+    count = 0
+    for values in rows:
+        a = cfd.models.RawData()
+        a.init_from_values((first_id + count + 1,) + values[1:])
+        if dedupe and dedupe.is_duplicate(a.broker_ref, a.ref_date, a.amount):
+            continue
+        session.add(a)
+        count = count + 1
+    return count
+
+
+@sqlstats.stage('import')
+def import_bulk(session, rows, batch_size, first_id=0, dedupe=None):
+    ''' Import parsed rows as plain tuples, written to stock_raw with batched
+    executemany inserts.  Nothing is committed here, so the import is still
+    all-or-nothing.  Returns number of rows inserted.'''
+    stmt = cfd.models.RawData.__table__.insert()
+    fields = cfd.models.RawData.IMPORT_FIELDS
+    batch = []
+    count = 0
+    for values in rows:
+        values = dict(zip(fields, (first_id + count + 1,) + values[1:]))
+        if dedupe and dedupe.is_duplicate(values['broker_ref'], values['ref_date'],
+                                          values['amount']):
+            continue
+        batch.append(values)
+        count = count + 1
+        if len(batch) >= batch_size:
+            session.execute(stmt, batch)
+            batch = []
+    if batch:
+        session.execute(stmt, batch)
+    return count
 
 
 def raw_import():
-    if (len(sys.argv) > 1):
-        input_filename = sys.argv[1]
-        print("Using input file:", input_filename)
-    else:
-        sys.exit("Usage: import_activity.py <inputfile>")
+    parser = argparse.ArgumentParser(description='cfd-import: Import raw transaction data file')
+    parser.add_argument('--bulk', action='store_true',
+                        help='use batched inserts instead of ORM objects')
+    parser.add_argument('--batch-size', type=int,
+                        default=cfd.config.g_config.import_batch_size,
+                        help='rows per insert batch in bulk mode (default %(default)d)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='add to existing data, skipping rows already imported')
+    parser.add_argument('--jobs', type=int, default=multiprocessing.cpu_count(),
+                        help='processes used to parse multiple files (default %(default)d)')
+    parser.add_argument('FILE', nargs='+',
+                        help='input CSV file, directory or glob pattern, or - for stdin')
+    parser.add_argument('--sql-stats', action='store_true',
+                        help='report SQL statements, rows and time per stage '
+                        '(same as setting %s=1)' % sqlstats.ENV_VAR)
+    args = parser.parse_args()
+    if args.batch_size < 1:
+        sys.exit("Invalid batch size")
+    # Load the models (and SQLAlchemy) only once the arguments are OK.
+    import sqlalchemy
+    importlib.import_module('cfd.models')
+    if args.sql_stats:
+        cfd.models.enable_sql_stats()
+
+    files = input_files(args.FILE)
+    if '-' in files and len(files) > 1:
+        sys.exit("Can't use - (stdin) with other input files")
 
     session = cfd.models.get_session()
 
-    count = 0
-    ok = True
-
-    with open(input_filename, 'rb') as csvfile:
-        reader = csv.reader(csvfile)
-
-        for row in reader:
-            #print(row[0], row[1], row[2])
-            try:
-                a = cfd.models.RawData(row, count + 1)
-                session.add(a)
-                count = count + 1
-            except cfd.models.ModelsError as e:
-                print("****** IMPORT ERROR AT LINE %d" % (reader.line_num))
-                print("****** ", e.msg)
-                print(row)
-                ok = False
-                break
-
-    if ok:
-        session.commit()
-        print("Imported %d entries." % (count,))
+    first_id = 0
+    dedupe = None
+    if args.incremental:
+        # Carry on import order from previous imports.
+        RawData = cfd.models.RawData
+        first_id = session.query(sqlalchemy.func.max(RawData.import_id)).scalar() or 0
+        with sqlstats.stage('dedupe'):
+            dedupe = ImportDedupe(session)
 
-    return ok
+    rows = parsed_rows(files, args.jobs)
+    try:
+        if args.bulk:
+            count = import_bulk(session, rows, args.batch_size, first_id, dedupe)
+        else:
+            count = import_orm(session, rows, first_id, dedupe)
+    except ImportFileError as e:
+        import_error(e)
+        session.rollback()
+        return False
+
+    with sqlstats.stage('commit'):
+        session.commit()
+    print("Imported %d entries." % (count,))
+    if dedupe:
+        print("Skipped %d entries already imported." % (dedupe.skipped,))
+    return True
 
 if __name__ ==  "__main__":
     raw_import()
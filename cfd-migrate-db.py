@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+#  cfd-migrate-db.py
+#
+#  Convert money/quantity columns of an existing database to the currency
+#  storage type set in cfd/config.py, and add any missing indexes.
+#
+import os.path
+import sys
+import argparse
+sys.path.insert(0, '.')
+
+from cfd.config import g_config
+
+if __name__ ==  "__main__":
+    parser = argparse.ArgumentParser(description='cfd-migrate-db: Convert database to configured currency storage')
+    parser.add_argument('--from-scale', type=int,
+                        help='scale of existing data, if stored as scaled integers')
+    parser.add_argument('--indexes-only', action='store_true',
+                        help='only add missing indexes, leave currency storage as is')
+    args = parser.parse_args()
+    # Load the models (and SQLAlchemy) only once the arguments are OK.
+    from cfd.models import db_migrate_currency, db_create_indexes
+    if not args.indexes_only:
+        print("Converting database to '%s' currency storage" % (g_config.currency_storage,))
+        db_migrate_currency(args.from_scale)
+    db_create_indexes()
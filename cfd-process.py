@@ -27,14 +27,16 @@ import os.path
 import sys
 import logging
 import re
-import sqlalchemy
 import decimal
 import datetime
+import time
+import argparse
 
 sys.path.insert(0, '.')
 
-from cfd.models import RawData, StockPosition, StockActivity, StockTrade, ModelsError, ActionType
-from cfd.models import get_session, db_refresh_trades
+from cfd.config import g_config
+from cfd.util import chunks, add_log_handlers, log_level, LOG_LEVELS
+from cfd import sqlstats
 
 D = decimal.Decimal
 
@@ -47,16 +49,18 @@ __version__ = VERSION_STRING
 logger = logging.getLogger()
 
 
-def init_logging(level=None):
+def init_logging(level=None, filename='gencfdprocess.log', background=False):
     formatter = logging.Formatter('%(levelname)s:\t%(message)s\t[%(name)s]')
     console = logging.StreamHandler()
     console.setLevel(logging.INFO)
     console.setFormatter(formatter)
-    logfile = logging.FileHandler('gencfdprocess.log')
-    logfile.setLevel(logging.DEBUG)
-    logfile.setFormatter(formatter)
-    logger.addHandler(console)
-    logger.addHandler(logfile)
+    handlers = [console]
+    if filename:
+        logfile = logging.FileHandler(filename)
+        logfile.setLevel(logging.DEBUG)
+        logfile.setFormatter(formatter)
+        handlers.append(logfile)
+    add_log_handlers(handlers, background)
     
     if level:
         logger.setLevel(level)
@@ -65,12 +69,65 @@ def init_logging(level=None):
         logger.info("Starting " + APPLICATION_NAME + " " + VERSION_STRING)
 
 
-def get_comm_for_position(session, ref_date, broker_ref):
-    q = session.query(RawData).filter(RawData.category==RawData.CAT_COMM, 
-                                      RawData.ref_date<=ref_date,
-                                      RawData.description.like('%'+broker_ref+'%')
-                                      ).order_by(RawData.import_id, RawData.ref_date)
-    return q.all()
+class FeeIndex(object):
+    ''' Commission (CAT_COMM) and other fee (CAT_RISK) transactions, keyed by
+    the broker ref of the trade they belong to.  Built once per processing
+    run, so finding the fees for a trade is a dict lookup instead of a
+    LIKE scan of stock_raw.'''
+
+    def __init__(self, session, broker_refs):
+        self.comm = {}
+        self.risk = {}
+        refs = set(r.upper() for r in broker_refs)
+        lengths = sorted(set(len(r) for r in refs))
+        for category, table, order in (
+                (RawData.CAT_COMM, self.comm, (RawData.import_id, RawData.ref_date)),
+                (RawData.CAT_RISK, self.risk, (RawData.id,))):
+            q = session.query(RawData.id, RawData.description).filter(
+                                    RawData.category==category).order_by(*order)
+            for (raw_id, description) in q:
+                for ref in self.find_refs(description, refs, lengths):
+                    table.setdefault(ref, []).append(raw_id)
+
+        # Only load the fee rows belonging to the trades being processed.
+        rows = {}
+        ids = set(i for table in (self.comm, self.risk)
+                    for l in table.values() for i in l)
+        for chunk in chunks(ids):
+            for raw in session.query(RawData).filter(RawData.id.in_(chunk)):
+                rows[raw.id] = raw
+        for table in (self.comm, self.risk):
+            for ref, l in table.items():
+                table[ref] = [(rows[i].ref_date, rows[i]) for i in l]
+        logger.debug("Indexed %d commission and %d other fee broker refs",
+                     len(self.comm), len(self.risk))
+
+    @staticmethod
+    def find_refs(description, refs, lengths):
+        ''' Return every known broker ref appearing anywhere in description.
+        Matches the same way as LIKE '%ref%' did (case insensitive).'''
+        description = description.upper()
+        found = set()
+        for n in lengths:
+            for start in range(len(description) - n + 1):
+                if description[start:start + n] in refs:
+                    found.add(description[start:start + n])
+        return found
+
+    @staticmethod
+    def lookup(table, ref_date, broker_ref):
+        return [raw for (dt, raw) in table.get(broker_ref.upper(), ())
+                if dt <= ref_date]
+
+    def get_comm(self, ref_date, broker_ref):
+        return self.lookup(self.comm, ref_date, broker_ref)
+
+    def get_other_fees(self, ref_date, broker_ref):
+        return self.lookup(self.risk, ref_date, broker_ref)
+
+
+def get_comm_for_position(fee_index, ref_date, broker_ref):
+    return fee_index.get_comm(ref_date, broker_ref)
 
 
 def get_position_activities(session, pos, is_first_only=False):
@@ -82,20 +139,39 @@ def get_position_activities(session, pos, is_first_only=False):
     return q.all()
 
 
-def new_position(session, raw):
+def load_positions(session, broker_refs):
+    ''' Get existing positions for broker_refs, for an incremental run.
+    Returns dict of broker_ref --> (position, opening activity).'''
+    positions = {}
+    for chunk in chunks(broker_refs):
+        for pos in session.query(StockPosition).filter(
+                                StockPosition.broker_ref.in_(chunk)
+                                ).order_by(StockPosition.id):
+            if pos.broker_ref not in positions:
+                positions[pos.broker_ref] = pos
+    by_id = dict((pos.id, pos) for pos in positions.values())
+    result = {}
+    for chunk in chunks(by_id.keys()):
+        for a in session.query(StockActivity).filter(
+                                StockActivity.position_id.in_(chunk)
+                                ).order_by(StockActivity.id):
+            pos = by_id[a.position_id]
+            if pos.broker_ref not in result:
+                result[pos.broker_ref] = (pos, a)
+    return result
+
+
+def new_position(session, fee_index, raw):
     # find opening commission transaction
     logger.debug("Creating new position for %s", raw.broker_ref)
-    q = session.query(RawData).filter(RawData.category==RawData.CAT_RISK, 
-                                       RawData.ref_date<=raw.ref_date,
-                                       RawData.description.like('%'+raw.broker_ref+'%'))
-    other_fees = q.all()
+    other_fees = fee_index.get_other_fees(raw.ref_date, raw.broker_ref)
     total_other_fees = D(0)
     if len(other_fees):
         for fee in other_fees:
             total_other_fees += fee.amount
         logger.debug("Total of %d other fees for %s: %s", 
                      len(other_fees), raw.broker_ref, total_other_fees)
-    comm = get_comm_for_position(session, raw.ref_date, raw.broker_ref)
+    comm = get_comm_for_position(fee_index, raw.ref_date, raw.broker_ref)
     if len(comm) == 2:
         logger.debug("%d commissions found for %s", len(comm), raw.broker_ref)
     else:
@@ -134,7 +210,8 @@ def new_position(session, raw):
     session.add(trade)
     session.add(a_open)
     session.add(a_close)
-    session.commit()
+    # Flush (not commit) to get ids, so the whole run stays in one transaction.
+    session.flush()
 
     if c_open:
         c_open.position_id = pos.id
@@ -146,18 +223,21 @@ def new_position(session, raw):
         for fee in other_fees:
             fee.position_id = pos.id
             fee.activity_id = a_open.id
+    raw.position_id = pos.id
+    raw.activity_id = a_close.id
 
     trade.position_id = pos.id
     a_open.position_id = pos.id
     a_close.position_id = pos.id
     a_open.trade_id = trade.id
     a_close.trade_id = trade.id
-    
+    return pos, a_open
 
-def add_to_position(session, raw, pos):
+
+def add_to_position(session, fee_index, raw, pos, a_open):
     # find opening commission transaction
     logger.debug("Adding raw trade %d to position %d for  %s", raw.id, pos.id, raw.broker_ref)
-    comm = get_comm_for_position(session, raw.ref_date, raw.broker_ref)
+    comm = get_comm_for_position(fee_index, raw.ref_date, raw.broker_ref)
     if len(comm) > 1:
         logger.info("%d commissions found for multi-tranche %s", len(comm), raw.broker_ref)
     pos.num_closes += 1
@@ -180,29 +260,67 @@ def add_to_position(session, raw, pos):
 
     # Update quantity in first open activity.
     # The underlying logic only works if there is only one open, but multiple closes.
-    a_open = get_position_activities(session, pos, True)
     a_open.quantity += raw.size
 
     trade = StockTrade(a_open, a_close, raw)    
 
     session.add(trade)
     session.add(a_close)
-    session.commit()
+    session.flush()
 
     if c_close:
         c_close.position_id = pos.id
         c_close.activity_id = a_close.id
+    raw.position_id = pos.id
+    raw.activity_id = a_close.id
     a_close.position_id = pos.id
     a_close.trade_id = trade.id
 
 
-def cfd_process():
+@sqlstats.stage('process')
+def cfd_process(commit_interval=0, incremental=False):
+    ''' Generate positions/activities/trades from the raw trade data.
+    Everything is done in a single transaction, unless commit_interval is
+    given, in which case a commit is done every commit_interval trades.
+    If incremental, only trades not yet processed are used, and existing
+    positions are extended rather than rebuilt.'''
     session = get_session()
+    # Objects loaded here are only changed here, so don't reload them all
+    # after every (interval) commit.
+    session.expire_on_commit = False
+    start_time = time.time()
+
+    with sqlstats.stage('load'):
+        q = session.query(RawData).filter(
+                                        sqlalchemy.or_(RawData.category==RawData.CAT_TRADE,
+                                                       RawData.category==RawData.CAT_INDEX))
+        if incremental:
+            q = q.filter(RawData.position_id==None)
+        trades = q.order_by(RawData.import_id, RawData.ref_date).all()
+        broker_refs = set(i.broker_ref for i in trades)
+
+        fee_index = FeeIndex(session, broker_refs)
+        # broker_ref --> (position, opening activity), for positions created so far
+        if incremental:
+            positions = load_positions(session, broker_refs)
+            logger.info("Processing %d new trades, %d for existing positions",
+                        len(trades), len(positions))
+        else:
+            positions = {}
+
+    with sqlstats.stage('positions'):
+        process_trades(session, fee_index, trades, positions, commit_interval)
+    with sqlstats.stage('commit'):
+        session.commit()
+
+    elapsed = time.time() - start_time
+    logger.info("Processed %d trades in %.2f seconds (%.0f rows/sec)",
+                len(trades), elapsed, len(trades) / elapsed if elapsed > 0 else 0)
+
 
-    for i in session.query(RawData).filter(
-                                    sqlalchemy.or_(RawData.category==RawData.CAT_TRADE,
-                                                   RawData.category==RawData.CAT_INDEX)
-                                    ).order_by(RawData.import_id, RawData.ref_date):
+def process_trades(session, fee_index, trades, positions, commit_interval=0):
+    count = 0
+    for i in trades:
         # OK, so this will essentially be a closing trade.  Or part of one.
         # Check if there is already an open position with this broker ref
         #     TODO
@@ -212,21 +330,49 @@ def cfd_process():
         #     There's no way to defnitively process if there is (without cross referencing
         #     other data files).  For now can just assume first commission is on trade open,
         #     and all subsequent commissions are as part of closing a tranche.
-        q = session.query(StockPosition).filter(StockPosition.broker_ref==i.broker_ref)
-        pos = q.first()
-        if pos is None:
+        if i.broker_ref not in positions:
             # Create new Position, and open/close activities
-            pos = new_position(session, i)
+            positions[i.broker_ref] = new_position(session, fee_index, i)
         else:
             # update quantities/activities in the existing position
-            add_to_position(session, i, pos)
-    session.commit()
+            pos, a_open = positions[i.broker_ref]
+            add_to_position(session, fee_index, i, pos, a_open)
+        count += 1
+        if commit_interval and count % commit_interval == 0:
+            session.commit()
 
 
 if __name__ ==  "__main__":
-    loglevel = logging.DEBUG
-    init_logging(loglevel)
+    parser = argparse.ArgumentParser(description='cfd-process: Generate positions and trades from raw data')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only process new trades, extending existing positions')
+    parser.add_argument('--commit-interval', type=int,
+                        default=g_config.process_commit_interval,
+                        help='commit every N trades (default: single transaction)')
+    parser.add_argument('--sql-stats', action='store_true',
+                        help='report SQL statements, rows and time per stage '
+                        '(same as setting %s=1)' % sqlstats.ENV_VAR)
+    parser.add_argument('--log-level', choices=LOG_LEVELS, default='info',
+                        help='log level (default %(default)s)')
+    parser.add_argument('--log-file', default='gencfdprocess.log',
+                        help='log file, or "" for none (default %(default)s)')
+    parser.add_argument('--background-log', action='store_true',
+                        help='write log messages from a background thread, '
+                        'instead of as they are logged')
+    args = parser.parse_args()
+    if args.commit_interval < 0:
+        sys.exit("Invalid commit interval")
+    # Load the models (and SQLAlchemy) only once the arguments are OK.
+    import sqlalchemy
+    from cfd.models import RawData, StockPosition, StockActivity, StockTrade, ActionType
+    from cfd.models import get_session, db_refresh_trades, enable_sql_stats
+    if args.sql_stats:
+        enable_sql_stats()
+
+    init_logging(log_level(args.log_level), args.log_file, args.background_log)
     logger.info("CFD PROCESS: " + str(datetime.datetime.now()))
-    db_refresh_trades()
-    cfd_process()
+    if not args.incremental:
+        with sqlstats.stage('refresh'):
+            db_refresh_trades()
+    cfd_process(args.commit_interval, args.incremental)
 
@@ -26,94 +26,40 @@ from __future__ import division, unicode_literals, print_function
 import os.path
 import sys
 import re
-import sqlalchemy
 import decimal
 import datetime as dt
 import argparse
 
 sys.path.insert(0, '.')
 
-from cfd.models import get_session, RawData, ModelsError
 from cfd.util import mkdate
+from cfd import sqlstats
 
 D = decimal.Decimal
 
+@sqlstats.stage('report')
 def legacy_summary(start_date, end_date):
     session = get_session()
-
-    total_profit = D(0)
-    count_trades = 0
-    interest_long = D(0)
-    interest_short = D(0)
-    commission= D(0)
-    other_comm= D(0)
-    xfee= D(0)
-    dividends= D(0)
-    deposit= D(0)
-    withdraw= D(0)
-    final_balance = D(0)
-    unknown = D(0)
-
-    if start_date and end_date:
-        q = session.query(RawData).filter(RawData.ref_date>=start_date,RawData.ref_date<=end_date)
-    elif start_date:
-        q = session.query(RawData).filter(RawData.ref_date>=start_date)
-    elif end_date:
-        q = session.query(RawData).filter(RawData.ref_date<=end_date)
-    else:
-        q = session.query(RawData)
-
-    for i in q:
-        if i.category == RawData.CAT_TRADE:
-            total_profit += i.amount
-            count_trades += 1
-        elif i.category == RawData.CAT_TRANSFER:
-            if i.type == "DEPO":
-                deposit += i.amount
-            elif i.type == "WITH":
-                withdraw += i.amount
-        elif i.category == RawData.CAT_XFEE:
-            xfee += i.amount
-        elif i.category == RawData.CAT_INTEREST:
-            if i.type == "DEPO":
-                interest_short += i.amount            
-            elif i.type == "WITH":
-                interest_long += i.amount
-        elif i.category == RawData.CAT_DIVIDEND:
-            dividends += i.amount
-        elif i.category == RawData.CAT_COMM:
-            commission += i.amount
-        elif i.category == RawData.CAT_RISK:
-            other_comm += i.amount
-        else:
-            unknown += i.amount
-            
-        final_balance += i.amount
-
-
-    print("CFD LEGACY SUMMARY\n")
-    print("Total profit/loss:                      $%s" % (str(total_profit),))
-    print("Number of trades: ", count_trades)
-    print("\nInterest paid on long positions:        $%s\n"
-          "Interest earned on short positions:     $%s\n" % (str(interest_long), str(interest_short)))
-    print("Commissions:                            $%s\n"
-          "Guaranteed stop loss commissions:       $%s\n" % (str(commission), str(other_comm)))
-    print("ASX Exchange data fees:                 $%s\n\n"
-          "Total dividend adjustments:             $%s\n" % (str(xfee), str(dividends)))
-
-    print("Deposits:      $%s\nWithdrawals:   $%s" % (str(deposit), str(withdraw)))
-    print("Unknown:       $%s\n\nFINAL BALANCE: $%s" % (str(unknown), str(final_balance)))
+    print_legacy_summary(summarise(session, start_date, end_date))
 
 if __name__ ==  "__main__":
     parser = argparse.ArgumentParser(description='ig-csv-export: Export trading data into CSV files')
     parser.add_argument('--start', type=mkdate, help='start date')
     parser.add_argument('--end', type=mkdate, help='end date')
     parser.add_argument('--fyau', type=int, help='Australian financial year (ending)')
+    parser.add_argument('--sql-stats', action='store_true',
+                        help='report SQL statements, rows and time per stage '
+                        '(same as setting %s=1)' % sqlstats.ENV_VAR)
 
     start = None
     end = None
     args = parser.parse_args()
     #print(args)
+    # Load the models (and SQLAlchemy) only once the arguments are OK.
+    from cfd.models import get_session, enable_sql_stats
+    from cfd.summary import summarise, print_legacy_summary
+    if args.sql_stats:
+        enable_sql_stats()
     if args.fyau:
         year = args.fyau
         if args.start or args.end:
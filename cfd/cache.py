@@ -0,0 +1,138 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# cache.py: In memory indexes of the raw data and trades, so report-server.py
+# can answer report and export requests for any date range without going
+# back to the database.
+#
+# Output is the same as cfd-report.py and cfd-csv-export.py for the same
+# dates.
+#
+
+from __future__ import division, unicode_literals, print_function
+import time
+import bisect
+import logging
+import datetime as dt
+
+from cfd.models import RawData, StockTrade
+from cfd.models import get_engine, get_session
+from cfd.config import g_config
+from cfd.currency import ScaledInteger
+from cfd.cacheutil import DataVersion, load_cache
+from cfd.summary import Summary, stream_raw
+from cfd.export import cash_file, cash_row, trade_row
+
+logger = logging.getLogger(__name__)
+
+
+class ReportCache(object):
+    ''' Raw data totals per day, the rows of each export file, and trades
+    sorted by exit date.'''
+
+    def __init__(self):
+        # Sorted dates with raw data, and for each, a Summary of that day.
+        self.days = []
+        self.day_totals = []
+        # cash file --> list of (ref_date, row), in export order
+        self.cash = dict()
+        # Trade rows in export order (by exit date), and their exit dates.
+        self.trades = []
+        self.trade_dates = []
+        self.rows = 0
+        self.seconds = 0.0
+
+    def load(self, session):
+        start_time = time.time()
+        days = {}
+        for i in stream_raw(session, ordered=True):
+            s = days.get(i.ref_date)
+            if s is None:
+                s = days[i.ref_date] = Summary()
+            s.add(i.category, i.type, i.amount)
+            name = cash_file(i.category, i.type)
+            if name is not None:
+                self.cash.setdefault(name, []).append((i.ref_date, cash_row(i)))
+            self.rows += 1
+        self.days = sorted(days)
+        self.day_totals = [days[d] for d in self.days]
+
+        q = session.query(StockTrade).order_by(StockTrade.exit_date,
+                                               StockTrade.import_id)
+        for t in q:
+            self.trades.append(trade_row(t))
+            self.trade_dates.append(t.exit_date)
+        self.seconds = time.time() - start_time
+        logger.info("Loaded %d raw rows (%d days), %d trades in %.2f seconds",
+                    self.rows, len(self.days), len(self.trades), self.seconds)
+
+    def day_range(self, start_date=None, end_date=None):
+        lo = 0 if start_date is None else bisect.bisect_left(self.days, start_date)
+        hi = (len(self.days) if end_date is None
+              else bisect.bisect_right(self.days, end_date))
+        return lo, hi
+
+    def summary(self, start_date=None, end_date=None):
+        ''' Summary of the raw data in the date range, as streamed by
+        cfd-csv-export.py.'''
+        summary = Summary()
+        lo, hi = self.day_range(start_date, end_date)
+        for day in self.day_totals[lo:hi]:
+            for key, amount in day.totals.items():
+                summary.add_total(key[0], key[1], amount, day.counts[key])
+        return summary
+
+    def report_summary(self, start_date=None, end_date=None):
+        ''' Summary of the raw data in the date range, as summed by
+        cfd-report.py (i.e. by sqlite, for scaled integer amounts).'''
+        summary = self.summary(start_date, end_date)
+        amount_type = RawData.__table__.c.amount.type
+        if isinstance(amount_type, ScaledInteger):
+            # Same digits as a sum of the integers read back from sqlite.
+            for key, amount in summary.totals.items():
+                summary.totals[key] = amount_type.process_result_value(
+                    amount_type.process_bind_param(amount, None), None)
+        return summary
+
+    def cash_rows(self, name, start_date=None, end_date=None):
+        return [row for ref_date, row in self.cash.get(name, ())
+                if (start_date is None or ref_date >= start_date) and
+                   (end_date is None or ref_date <= end_date)]
+
+    def trade_rows(self, start_date=None, end_date=None):
+        # cfd-csv-export.py compares exit date/times to dates, so trades
+        # exiting on the end date itself aren't included.
+        lo = 0
+        hi = len(self.trade_dates)
+        if start_date is not None:
+            lo = bisect.bisect_left(self.trade_dates,
+                                    dt.datetime.combine(start_date, dt.time()))
+        if end_date is not None:
+            hi = bisect.bisect_left(self.trade_dates,
+                                    dt.datetime.combine(end_date, dt.time()))
+        return self.trades[lo:max(lo, hi)]
+
+
+def data_version():
+    return DataVersion(get_engine(), g_config.is_sqlite())
+
+
+def load():
+    return load_cache(ReportCache(), get_session())
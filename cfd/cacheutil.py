@@ -0,0 +1,64 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# cacheutil.py: Loading the in memory caches used by report-server.py
+# (cfd/cache.py and eto/cache.py), and noticing when their database changes.
+#
+
+from __future__ import division, unicode_literals, print_function
+
+
+class DataVersion(object):
+    ''' Notices commits to the database by other processes (imports etc).
+    Uses sqlite's PRAGMA data_version, which changes when another
+    connection commits, so it keeps a connection of its own.  Other
+    databases (is_sqlite False) are never seen to change.'''
+
+    def __init__(self, engine, is_sqlite):
+        self.conn = None
+        if is_sqlite:
+            self.conn = engine.connect()
+        self.version = self.current()
+
+    def current(self):
+        if self.conn is None:
+            return None
+        return self.conn.execute('PRAGMA data_version').scalar()
+
+    def changed(self):
+        version = self.current()
+        if version == self.version:
+            return False
+        self.version = version
+        return True
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+
+def load_cache(cache, session):
+    ''' Load cache (with a load(session) method) from a new session, which
+    is closed afterwards.  Returns the cache.'''
+    try:
+        cache.load(session)
+        return cache
+    finally:
+        session.close()
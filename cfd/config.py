@@ -21,9 +21,39 @@
 # config.py
 #
 
+import os
+
+
 class Config(object):
     def __init__(self):
-        self.db_connect_str = 'sqlite:///thcfd.db'
+        # Can be overridden by the TH_CFD_DB environment variable (e.g.
+        # trade-herder.py --db).
+        self.db_connect_str = os.environ.get('TH_CFD_DB', 'sqlite:///thcfd.db')
+        # How money/quantity columns are stored in sqlite: 'string' (decimal
+        # strings) or 'scaled' (integer units of 10**-currency_scale).
+        # Existing databases need to be converted with cfd-migrate-db.py.
+        self.currency_storage = 'string'
+        self.currency_scale = 6
+        # Number of rows per executemany() insert when bulk importing.
+        self.import_batch_size = 5000
+        # Trades processed per commit in cfd-process.py (0 = single commit).
+        self.process_commit_interval = 0
+        # Rule table used by cfd-categorise.py.
+        self.category_rules_file = os.path.join(os.path.dirname(__file__),
+                                                'category_rules.json')
+        # PRAGMAs run on each new sqlite connection, in order.  Set to []
+        # for sqlite's defaults.  WAL with synchronous=NORMAL only syncs at
+        # checkpoints; cache_size is in KiB when negative.
+        self.sqlite_pragmas = [('journal_mode', 'WAL'),
+                               ('synchronous', 'NORMAL'),
+                               ('cache_size', -65536),
+                               ('mmap_size', 268435456)]
+        # With --sql-stats (or TH_SQL_STATS=1), statements run more than
+        # this many times in one stage are reported as possible N+1 queries.
+        self.sql_stats_repeat_limit = 50
     
     def is_sqlite(self):
-        return True   # for now
+        return self.db_connect_str.startswith('sqlite')
+
+
+g_config = Config()
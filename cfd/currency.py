@@ -0,0 +1,132 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# currency.py: Column types for money/quantity values in sqlite, and
+# conversion of existing databases between them (used by the cfd and eto
+# models).
+#
+
+from __future__ import division, unicode_literals, print_function
+import logging
+import decimal
+import numbers
+import sqlalchemy
+
+logger = logging.getLogger(__name__)
+
+
+class DecimalString(sqlalchemy.types.TypeDecorator):
+    impl = sqlalchemy.types.String
+
+    def process_bind_param(self, value, dialect):
+        return str(value)
+
+    def process_result_value(self, value, dialect):
+        return decimal.Decimal(value)
+
+
+class ScaledInteger(sqlalchemy.types.TypeDecorator):
+    ''' Exact decimal stored as an integer number of 10**-scale units, so
+    sqlite can SUM/ORDER BY it numerically.  Values with more than scale
+    decimal places are rounded (half even).  Values are returned without
+    the scale padding, but with at least 2 decimal places.'''
+    impl = sqlalchemy.types.Integer
+
+    CENTS = decimal.Decimal('0.01')
+
+    def __init__(self, scale):
+        super(ScaledInteger, self).__init__()
+        self.scale = scale
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        value = decimal.Decimal(value).scaleb(self.scale)
+        return int(value.to_integral_value(decimal.ROUND_HALF_EVEN))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        value = decimal.Decimal(value).scaleb(-self.scale)
+        cents = value.quantize(self.CENTS)
+        if cents == value:
+            return cents
+        return value.normalize()
+
+
+def currency_type(config):
+    ''' Column type for money/quantity values, as configured.'''
+    #
+    # Grrrr....
+    #
+    if config.is_sqlite():
+        if config.currency_storage == 'scaled':
+            return ScaledInteger(config.currency_scale)
+        else:
+            return DecimalString()
+    else:
+        return sqlalchemy.Numeric()
+
+
+def migrate_currency(engine, metadata, from_scale=None):
+    ''' Convert money/quantity columns of the tables in metadata to their
+    current column types.  Old values can be decimal strings, or (if
+    from_scale is given) scaled integers.  Each table is copied to a new
+    table with the new column types, then swapped in.'''
+    old_type = ScaledInteger(from_scale) if from_scale is not None else None
+    conn = engine.connect()
+    trans = conn.begin()
+    for table in metadata.sorted_tables:
+        currency_cols = [c.name for c in table.columns
+                         if isinstance(c.type, (DecimalString, ScaledInteger))]
+        if not currency_cols or not engine.dialect.has_table(conn, table.name):
+            continue
+        logger.info("Migrating %s", table.name)
+        new_name = table.name + '_migrate'
+        ddl = str(sqlalchemy.schema.CreateTable(table).compile(engine))
+        conn.execute(ddl.replace('CREATE TABLE %s ' % table.name,
+                                 'CREATE TABLE %s ' % new_name, 1))
+        names = [c.name for c in table.columns]
+        insert = 'INSERT INTO %s (%s) VALUES (%s)' % (
+                    new_name, ', '.join(names), ', '.join('?' * len(names)))
+        converters = []
+        for c in table.columns:
+            if c.name in currency_cols:
+                converters.append(c.type.process_bind_param)
+            else:
+                converters.append(None)
+        rows = []
+        for row in conn.execute('SELECT %s FROM %s' % (', '.join(names), table.name)):
+            values = []
+            for v, convert in zip(row, converters):
+                if convert and v is not None:
+                    if isinstance(v, numbers.Integral) and old_type:
+                        v = old_type.process_result_value(v, engine.dialect)
+                    v = convert(decimal.Decimal(v), engine.dialect)
+                values.append(v)
+            rows.append(tuple(values))
+        if rows:
+            conn.execute(insert, rows)
+        conn.execute('DROP TABLE %s' % table.name)
+        conn.execute('ALTER TABLE %s RENAME TO %s' % (new_name, table.name))
+        for index in table.indexes:
+            index.create(conn)
+    trans.commit()
+    conn.close()
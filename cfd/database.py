@@ -0,0 +1,81 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# database.py: Engine setup shared by the cfd and eto models, given their
+# config (cfd.config or eto.config) and metadata.
+#
+
+from __future__ import division, unicode_literals, print_function
+import logging
+import sqlalchemy
+
+from cfd import sqlstats
+
+logger = logging.getLogger(__name__)
+
+
+class Database(object):
+    ''' The engine for one database, created on first use, so
+    config.db_connect_str can be changed until then (and importing the
+    models doesn't touch the database).'''
+
+    def __init__(self, config):
+        self.config = config
+        self.engine = None
+        # Before any stage is entered, as the engine is only created when
+        # first used.
+        if sqlstats.env_enabled():
+            sqlstats.start(config.sql_stats_repeat_limit)
+
+    def get_engine(self):
+        if self.engine is None:
+            config = self.config
+            self.engine = sqlalchemy.create_engine(config.db_connect_str,
+                                                   echo=False)
+            if config.is_sqlite() and config.sqlite_pragmas:
+                sqlalchemy.event.listen(self.engine, 'connect',
+                                        self.set_sqlite_pragmas)
+            sqlstats.attach(self.engine)
+        return self.engine
+
+    def set_sqlite_pragmas(self, dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in self.config.sqlite_pragmas:
+            cursor.execute('PRAGMA %s = %s' % (name, value))
+        cursor.close()
+
+    def enable_sql_stats(self):
+        ''' Count statements per stage (see cfd.sqlstats), report at exit.'''
+        sqlstats.enable(self.get_engine(), self.config.sql_stats_repeat_limit)
+
+
+def create_indexes(engine, metadata):
+    ''' Add any indexes declared in metadata that are missing from an
+    existing database (e.g. one created before they were declared).'''
+    inspector = sqlalchemy.inspect(engine)
+    existing_tables = inspector.get_table_names()
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = set(ix['name'] for ix in inspector.get_indexes(table.name))
+        for index in table.indexes:
+            if index.name not in existing:
+                logger.info("Creating index %s", index.name)
+                index.create(engine)
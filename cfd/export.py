@@ -0,0 +1,96 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# export.py: Rows of the CSV export files (cfd-csv-export.py and
+# report-server.py)
+#
+
+from __future__ import division, unicode_literals, print_function
+import sys
+
+from cfd.models import RawData
+from cfd.summary import CASH_CATEGORIES, print_totals
+
+# Raw data categories counted as trades in the export summary.
+TRADE_CATEGORIES = (RawData.CAT_TRADE, RawData.CAT_INDEX)
+
+# Export files (without .csv) for "cash" transactions.
+CASH_FILES = ('div', 'longint', 'shortint', 'unknown')
+
+#
+# Order of columns we want in the trade file.
+#
+TRADE_COLUMNS = ['Exit Date', 'Entry Date',
+                 'Company',
+                 'Qty',
+                 'Buy Price', 'Total Position Entry',
+                 'Sell Price', 'Total Position Exit',
+                 'Entry Commission', 'Exit Commission', 'Other Commission',
+                 'Gross Return']
+
+
+def cash_file(category, raw_type):
+    ''' Export file (one of CASH_FILES) for a raw transaction, or None if
+    it isn't exported as a cash transaction.'''
+    if category == RawData.CAT_INTEREST:
+        if raw_type == "DEPO":
+            return 'shortint'
+        elif raw_type == "WITH":
+            return 'longint'
+    elif category == RawData.CAT_DIVIDEND:
+        return 'div'
+    elif category not in TRADE_CATEGORIES and category not in CASH_CATEGORIES:
+        return 'unknown'
+    return None
+
+
+def cash_row(raw):
+    '''List for "cash" transactions, like dividends, interest, etc'''
+    return [str(raw.ref_date), raw.description, str(raw.amount)]
+
+
+def trade_row(t):
+    return [
+        t.exit_date.strftime('%d/%m/%Y'), t.entry_date.strftime('%d/%m/%Y'),
+        t.symbol,
+        str(t.quantity),
+        str(t.entry_price), str(t.get_entry_total()),
+        str(t.exit_price),  str(t.get_exit_total()),
+        str(t.entry_brokerage),
+        str(t.exit_brokerage),
+        str(t.fees),
+        str(t.gross_total_imp)
+        ]
+
+
+def print_export_summary(summary, start_date, end_date, out=sys.stdout):
+    print("\nCFD EXPORT SUMMARY", file=out)
+    if not start_date and not end_date:
+        print("[entire data set]\n", file=out)
+    else:
+        datestr = ""
+        if start_date:
+            datestr += "FROM " + str(start_date) + " "
+        if end_date:
+            datestr += "TO " + str(end_date)
+        datestr += '\n'
+        print(datestr, file=out)
+
+    print_totals(summary, TRADE_CATEGORIES, out)
@@ -0,0 +1,103 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# importfile.py: Reading CSV input files for cfd-import.py and
+# eto-import.py.  Several files are parsed in parallel, by worker
+# processes, but handed back in the order given.
+#
+
+from __future__ import division, unicode_literals, print_function
+import os.path
+import sys
+import csv
+import glob
+import decimal
+import functools
+import itertools
+import multiprocessing
+
+
+def input_files(names):
+    ''' Expand directories (to the *.csv files in them) and glob patterns,
+    keeping the order given.'''
+    files = []
+    for name in names:
+        if os.path.isdir(name):
+            files.extend(sorted(glob.glob(os.path.join(name, '*.csv'))))
+        elif name != '-' and not os.path.exists(name):
+            files.extend(sorted(glob.glob(name)) or [name])
+        else:
+            files.append(name)
+    return files
+
+
+def iter_file(filename, parse_row):
+    ''' Yield parse_row(filename, line_num, row) for each row in the file
+    ('-' for stdin).'''
+    if filename == '-':
+        csvfile = sys.stdin
+    else:
+        csvfile = open(filename, 'rb')
+    with csvfile:
+        reader = csv.reader(csvfile)
+        for row in reader:
+            yield parse_row(filename, reader.line_num, row)
+
+
+def _strings(value):
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, tuple):
+        return tuple(_strings(v) for v in value)
+    return value
+
+
+def read_file(filename, parse_row):
+    ''' Parse a whole file, in a worker process.  Decimals (in the parsed
+    tuples) are sent back as strings, which are far cheaper to pickle, and
+    which the currency column types take just the same.'''
+    return [_strings(item) for item in iter_file(filename, parse_row)]
+
+
+def parsed_files(files, jobs, parse_row):
+    ''' Yield (filename, parsed rows) for each file, in the order given.
+    With more than one file and job, the files are parsed by a pool of
+    worker processes, so parse_row must be a module level function.  An
+    exception from parse_row, or the caller giving up early, stops the
+    workers.'''
+    if len(files) < 2 or jobs < 2:
+        for filename in files:
+            yield filename, iter_file(filename, parse_row)
+        return
+
+    pool = multiprocessing.Pool(min(jobs, len(files)))
+    done = False
+    try:
+        results = pool.imap(functools.partial(read_file, parse_row=parse_row),
+                            files)
+        pool.close()
+        for filename, rows in itertools.izip(files, results):
+            yield filename, rows
+        done = True
+    finally:
+        if done:
+            pool.join()
+        else:
+            pool.terminate()
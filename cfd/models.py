@@ -32,26 +32,29 @@ from sqlalchemy import Column, Integer, String
 from sqlalchemy import ForeignKey
 from sqlalchemy.orm import relationship, backref
 
-from cfd.config import Config
-
-g_config = Config()
+from cfd.config import g_config
+from cfd.util import parse_ref_date
+from cfd.database import Database, create_indexes
+from cfd.currency import currency_type, migrate_currency
 
 logger = logging.getLogger(__name__)
 
 
-engine = sqlalchemy.create_engine(
-                    g_config.db_connect_str,
-                    echo=False)
+_database = Database(g_config)
+get_engine = _database.get_engine
+enable_sql_stats = _database.enable_sql_stats
+
 Base = declarative_base()
-Session = sqlalchemy.orm.sessionmaker(bind=engine)
+Session = sqlalchemy.orm.sessionmaker()
 
 
 def get_session():
-    return Session()
+    return Session(bind=get_engine())
 
 
 def db_refresh_trades():
     ''' Delete and recreate generated tables for new processing run.'''
+    engine = get_engine()
 
     t = Base.metadata.tables['stock_position']
     t.drop(engine, True)
@@ -71,22 +74,7 @@ class ModelsError(Exception):
         self.msg = msg
 
 
-class DecimalString(sqlalchemy.types.TypeDecorator):
-    impl = sqlalchemy.types.String
-
-    def process_bind_param(self, value, dialect):
-        return str(value)
-
-    def process_result_value(self, value, dialect):
-        return decimal.Decimal(value)
-
-#
-# Grrrr.... 
-#
-if g_config.is_sqlite():
-    CurrencyType = DecimalString
-else:
-    CurrencyType = sqlalchemy.Numeric
+CurrencyType = currency_type(g_config)
 
 
 ###############################################################################
@@ -143,7 +131,7 @@ class RawData(Base):
     id 			= Column(Integer, primary_key=True)
     import_id 		= Column(Integer, nullable = False)  # order imported from input file
     type 		= Column(String(255), nullable = False)  
-    ref_date 		= Column(sqlalchemy.Date, nullable = False)  
+    ref_date 		= Column(sqlalchemy.Date, nullable = False, index = True)
     broker_ref  	= Column(String(255), nullable = False)  
     description  	= Column(String(255), nullable = False)  
     period      	= Column(String(255), nullable = False)  
@@ -154,49 +142,76 @@ class RawData(Base):
     amount 		= Column(CurrencyType, nullable = False)
     # Remaining fields are for scripting use, not imported from data.
     tags         	= Column(String(255), nullable = False)  
-    category 		= Column(Integer, nullable = False)
+    category 		= Column(Integer, nullable = False, index = True)
     position_id 	= Column(Integer, ForeignKey('stock_position.id'), nullable = True)
     activity_id	        = Column(Integer, ForeignKey('stock_activity.id'), nullable = True)
 
-    def __init__(self, row, importid=0):
-        self.init_from_list(row, importid)
+    # Columns populated from the input file, in the order returned by
+    # parse_list().
+    IMPORT_FIELDS = ('import_id', 'type', 'ref_date', 'broker_ref',
+                     'description', 'period', 'open', 'currency', 'size',
+                     'close', 'amount', 'tags', 'category')
+
+    def __init__(self, row=None, importid=0):
+        if row is not None:
+            self.init_from_list(row, importid)
 
     # Order of fields in raw ig input file is:
     #
     #   TYPE DATE REF DESC PERIOD OPEN CURRENCY SIZE CLOSE AMOUNT
     #
     def init_from_list(self, row, importid=0):
-        self.import_id = importid
-        self.type = row[0]
-        self.ref_date = datetime.datetime.strptime(row[1], '%d/%m/%y').date()
-        self.broker_ref = row[2]
-        self.description = row[3]
-        self.period = row[4]
-        self.open = decimal.Decimal(row[5])
-        self.currency = row[6]
-        self.size = row[7]
-        self.close = decimal.Decimal(row[8])
-        self.amount = decimal.Decimal(row[9])
-        self.tags = ""
-        self.category = self.CAT_UNKNOWN 
+        self.init_from_values(self.parse_list(row, importid))
+
+    def init_from_values(self, values):
+        ''' Set the imported columns from a parse_list() tuple.'''
+        for name, value in zip(self.IMPORT_FIELDS, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def parse_list(cls, row, importid=0):
+        ''' Parse a row from the input file into a plain tuple of values,
+        in IMPORT_FIELDS order.  Used directly by the bulk importer.'''
+        raw_type = row[0]
+        ref_date = parse_ref_date(row[1])
+        open_price = decimal.Decimal(row[5])
+        close_price = decimal.Decimal(row[8])
+        tags = ""
 
         # Adjust price only for entries before December 2008.
         # Add tag to those entries that were adjusted.
-        if self.type == 'DEAL' and self.ref_date < datetime.date(2008, 12, 1):
-            if self.open > 0:
-                self.open = self.open / 100
-            if self.close > 0:
-                self.close = self.close / 100
-            self.tags += "priceadjust|"
+        if raw_type == 'DEAL' and ref_date < datetime.date(2008, 12, 1):
+            if open_price > 0:
+                open_price = open_price / 100
+            if close_price > 0:
+                close_price = close_price / 100
+            tags += "priceadjust|"
+
+        return (importid, raw_type, ref_date, row[2], row[3], row[4],
+                open_price, row[6], row[7], close_price,
+                decimal.Decimal(row[9]), tags, cls.CAT_UNKNOWN)
 
 
 def db_create():
-    session = Session()
+    engine = get_engine()
+    session = Session(bind=engine)
     Base.metadata.drop_all(engine) 
     Base.metadata.create_all(engine) 
 #    db_populate_ref(session)
 
 
+def db_migrate_currency(from_scale=None):
+    ''' Convert money/quantity columns of an existing database to the
+    currency storage type currently configured (see cfd.currency).'''
+    migrate_currency(get_engine(), Base.metadata, from_scale)
+
+
+def db_create_indexes():
+    ''' Add any indexes missing from an existing database (e.g. one created
+    before the indexes were declared).'''
+    create_indexes(get_engine(), Base.metadata)
+
+
 
 #
 #  Different terminology to the OX scripts.  
@@ -230,7 +245,7 @@ class StockPosition(Base):
     gross_total_cost 	= Column(CurrencyType, nullable = False)
     num_opens 		= Column(Integer, nullable = False)
     num_closes 		= Column(Integer, nullable = False)
-    broker_ref 		= Column(String(255), nullable = False)  
+    broker_ref 		= Column(String(255), nullable = False, index = True)
 
 
     def __init__(self, sym, desc, dt):
@@ -255,7 +270,7 @@ class StockActivity(Base):
     __tablename__ = 'stock_activity'
     
     id 			= Column(Integer, primary_key=True)
-    position_id 	= Column(Integer, ForeignKey('stock_position.id') , nullable = True)  
+    position_id 	= Column(Integer, ForeignKey('stock_position.id') , nullable = True, index = True)
     # Stop gap for now.  But for situations like 2 tranche open and 1 close, an open 
     # activity will be associated with 2 trades!  (But I can't imagine any situation 
     # where 2 "close" activities would be associated with one trade...maybe option exercise???)
@@ -0,0 +1,133 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# rules.py: RawData categorisation rules
+#
+# Rules are loaded from a JSON file containing a list of rules, in priority
+# order.  Each rule is an object with:
+#
+#   "category"  name of RawData CAT_* constant, without the CAT_ prefix
+#   "type"      (optional) raw transaction type the rule applies to
+#
+# and at most one test on the description (all case insensitive):
+#
+#   "contains"  description contains this text
+#   "match"     regex matches at start of description
+#   "search"    regex matches anywhere in description
+#
+# A rule with no test matches every row of its type.  A row gets the
+# category of the first rule that matches, or CAT_UNKNOWN.
+#
+
+from __future__ import division, unicode_literals, print_function
+import re
+import json
+
+from cfd.models import RawData
+
+
+class RulesError(Exception):
+    """Base class for exceptions in this module."""
+    def __init__(self, msg):
+        self.msg = msg
+
+
+class CategoryRules(object):
+    ''' Rule table compiled once, for use in the per-row categorise loop.
+
+    For each transaction type, the rules that can apply to it are combined
+    (in order) into one alternation regex, one named group per rule, tried
+    with match() at the start of the description.  Alternatives are tried
+    left to right, so the first rule that matches wins, same as an
+    if/elif ladder.  Categorising a row is then one dict lookup and one
+    regex match, however many rules there are.'''
+
+    def __init__(self, rules):
+        self.categories = {}
+        by_type = {}
+        types = set(r.get('type') for r in rules) - set([None])
+        for n, rule in enumerate(rules):
+            group = 'r%d' % n
+            self.categories[group] = self.get_category(rule)
+            pattern = '(?P<%s>%s)' % (group, self.get_pattern(rule))
+            if rule.get('type') is None:
+                for t in types:
+                    by_type.setdefault(t, []).append(pattern)
+                by_type.setdefault(None, []).append(pattern)
+            else:
+                by_type.setdefault(rule['type'], []).append(pattern)
+        self.dispatch = {}
+        for t, patterns in by_type.items():
+            try:
+                self.dispatch[t] = re.compile('|'.join(patterns), re.IGNORECASE)
+            except re.error as e:
+                raise RulesError("Invalid rule regex: " + str(e))
+        self.default = self.dispatch.get(None)
+
+    @staticmethod
+    def get_category(rule):
+        try:
+            return getattr(RawData, 'CAT_' + rule['category'].upper())
+        except (KeyError, AttributeError):
+            raise RulesError("Invalid category in rule: " + repr(rule))
+
+    @staticmethod
+    def get_pattern(rule):
+        tests = [k for k in ('contains', 'match', 'search') if k in rule]
+        if len(tests) > 1:
+            raise RulesError("More than one test in rule: " + repr(rule))
+        if not tests:
+            return ''
+        if tests[0] == 'contains':
+            return r'[\s\S]*?' + re.escape(rule['contains'])
+        elif tests[0] == 'search':
+            return r'[\s\S]*?(?:' + rule['search'] + ')'
+        return '(?:' + rule['match'] + ')'
+
+    def categorise(self, raw_type, description):
+        regex = self.dispatch.get(raw_type, self.default)
+        if regex is not None:
+            m = regex.match(description)
+            if m:
+                return self.categories[m.lastgroup]
+        return RawData.CAT_UNKNOWN
+
+    def categorise_columns(self, types, descriptions):
+        ''' Categorise whole columns of (type, description).'''
+        categories = self.categories
+        dispatch = self.dispatch
+        default = self.default
+        result = []
+        for raw_type, description in zip(types, descriptions):
+            regex = dispatch.get(raw_type, default)
+            m = regex.match(description) if regex is not None else None
+            result.append(categories[m.lastgroup] if m else RawData.CAT_UNKNOWN)
+        return result
+
+
+def load_rules(filename):
+    try:
+        with open(filename) as f:
+            rules = json.load(f)
+    except (IOError, ValueError) as e:
+        raise RulesError("Can't load rules file %s: %s" % (filename, str(e)))
+    if not isinstance(rules, list):
+        raise RulesError("Rules file %s is not a list of rules" % (filename,))
+    return CategoryRules(rules)
@@ -0,0 +1,226 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# sqlstats.py: count SQL statements, rows and time per pipeline stage.
+#
+# Code marks stages with stage(name), as a context manager or decorator.
+# Nested stages are named outer.inner, and an outer stage's seconds include
+# its inner stages.  Nothing is recorded until start() (or enable()), which
+# is done by --sql-stats or by setting TH_SQL_STATS=1; until then stage()
+# does nothing else.  Statements are counted for engines given to attach()
+# (the models do so when they create theirs).  The report is printed to
+# stderr at exit.
+#
+# Statements are grouped by shape (the SQL, with IN lists of any length
+# the same), and a shape executed more than repeat_limit times in one stage
+# is reported as a likely N+1 query.
+#
+
+from __future__ import division, unicode_literals, print_function
+import os
+import re
+import sys
+import time
+import atexit
+import functools
+import collections
+
+
+ENV_VAR = 'TH_SQL_STATS'
+OTHER_STAGE = '(no stage)'
+SHAPE_WIDTH = 100
+
+_stats = None
+
+_param_list = re.compile(r'\?(\s*,\s*\?)+')
+
+
+def env_enabled():
+    return os.environ.get(ENV_VAR, '') not in ('', '0')
+
+
+class StageStats(object):
+    __slots__ = ('calls', 'seconds', 'statements', 'rows', 'changed',
+                 'sql_seconds', 'shapes')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.statements = 0
+        self.rows = 0
+        self.changed = 0
+        self.sql_seconds = 0.0
+        # shape --> [count, seconds]
+        self.shapes = {}
+
+
+class CountingCursor(object):
+    ''' DBAPI cursor wrapper that counts rows fetched.'''
+    def __init__(self, cursor, stage):
+        self._cursor = cursor
+        self._stage = stage
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stage.rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._stage.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stage.rows += len(rows)
+        return rows
+
+
+class SqlStats(object):
+    def __init__(self, repeat_limit):
+        self.repeat_limit = repeat_limit
+        self.stages = collections.OrderedDict()
+        self.path = []
+        self.starts = []
+        self.shape_cache = {}
+        self.exec_start = 0.0
+
+    def current(self):
+        name = '.'.join(self.path) if self.path else OTHER_STAGE
+        try:
+            return self.stages[name]
+        except KeyError:
+            s = self.stages[name] = StageStats()
+            return s
+
+    def push(self, name):
+        self.path.append(name)
+        self.current().calls += 1
+        self.starts.append(time.time())
+
+    def pop(self):
+        self.current().seconds += time.time() - self.starts.pop()
+        self.path.pop()
+
+    def shape(self, statement):
+        try:
+            return self.shape_cache[statement]
+        except KeyError:
+            s = ' '.join(_param_list.sub('?, ...', statement).split())
+            self.shape_cache[statement] = s
+            return s
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters,
+                              context, executemany):
+        self.exec_start = time.time()
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters,
+                             context, executemany):
+        elapsed = time.time() - self.exec_start
+        stage = self.current()
+        stage.statements += 1
+        stage.sql_seconds += elapsed
+        shape = self.shape(statement)
+        try:
+            counts = stage.shapes[shape]
+        except KeyError:
+            counts = stage.shapes[shape] = [0, 0.0]
+        counts[0] += 1
+        counts[1] += elapsed
+        if cursor.description is not None:
+            # The result is fetched from context.cursor.
+            if context is not None:
+                context.cursor = CountingCursor(cursor, stage)
+        elif cursor.rowcount > 0:
+            stage.changed += cursor.rowcount
+
+    def report(self, out=sys.stderr):
+        print("\nSQL STATS", file=out)
+        print("%-32s %6s %9s %9s %10s %10s %10s" % (
+              'stage', 'calls', 'seconds', 'sql secs', 'statements',
+              'fetched', 'changed'), file=out)
+        for name, s in self.stages.items():
+            print("%-32s %6d %9.3f %9.3f %10d %10d %10d" % (
+                  name, s.calls, s.seconds, s.sql_seconds, s.statements,
+                  s.rows, s.changed), file=out)
+        repeated = [(name, shape, counts)
+                    for name, s in self.stages.items()
+                    for shape, counts in s.shapes.items()
+                    if counts[0] > self.repeat_limit]
+        if repeated:
+            print("\nPOSSIBLE N+1: statements run more than %d times in a "
+                  "stage" % self.repeat_limit, file=out)
+            repeated.sort(key=lambda r: -r[2][1])
+            for name, shape, counts in repeated:
+                print("%-32s %6d %9.3f  %s" % (name, counts[0], counts[1],
+                                               shape[:SHAPE_WIDTH]), file=out)
+
+
+class stage(object):
+    ''' Attribute SQL run in a with block, or decorated function, to a
+    named stage.'''
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        if _stats is not None:
+            _stats.push(self.name)
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if _stats is not None:
+            _stats.pop()
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self:
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def start(repeat_limit):
+    ''' Start recording stages, report at exit.  Statements are counted for
+    engines given to attach().'''
+    global _stats
+    if _stats is None:
+        _stats = SqlStats(repeat_limit)
+        atexit.register(_stats.report)
+
+
+def attach(engine):
+    ''' Count statements run by engine, if recording has started.'''
+    import sqlalchemy
+    if _stats is None or sqlalchemy.event.contains(
+            engine, 'before_cursor_execute', _stats.before_cursor_execute):
+        return
+    sqlalchemy.event.listen(engine, 'before_cursor_execute',
+                            _stats.before_cursor_execute)
+    sqlalchemy.event.listen(engine, 'after_cursor_execute',
+                            _stats.after_cursor_execute)
+
+
+def enable(engine, repeat_limit):
+    ''' Start recording statements run by engine, report at exit.'''
+    start(repeat_limit)
+    attach(engine)
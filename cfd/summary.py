@@ -0,0 +1,148 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# summary.py: Totals of raw transaction data, for reports
+#
+
+from __future__ import division, unicode_literals, print_function
+import sys
+import decimal
+import sqlalchemy
+
+from cfd.models import RawData
+from cfd.currency import ScaledInteger
+
+D = decimal.Decimal
+
+# Rows fetched at a time when streaming raw data.
+STREAM_BATCH_SIZE = 1000
+
+# Non-trade categories with their own line in the summary.
+CASH_CATEGORIES = (RawData.CAT_TRANSFER, RawData.CAT_XFEE, RawData.CAT_INTEREST,
+                   RawData.CAT_DIVIDEND, RawData.CAT_COMM, RawData.CAT_RISK)
+
+
+def filter_dates(q, column, start_date=None, end_date=None):
+    if start_date:
+        q = q.filter(column>=start_date)
+    if end_date:
+        q = q.filter(column<=end_date)
+    return q
+
+
+def stream_raw(session, start_date=None, end_date=None, ordered=False):
+    ''' Lightweight (category, type, ref_date, description, amount) row
+    tuples for the date range, fetched in batches rather than all at once.'''
+    q = session.query(RawData.category, RawData.type, RawData.ref_date,
+                      RawData.description, RawData.amount)
+    q = filter_dates(q, RawData.ref_date, start_date, end_date)
+    if ordered:
+        q = q.order_by(RawData.import_id, RawData.ref_date)
+    return q.yield_per(STREAM_BATCH_SIZE)
+
+
+class Summary(object):
+    ''' Running totals (and counts) of amounts by category and type.
+    Memory used depends only on the number of distinct (category, type)
+    pairs, not the number of rows.'''
+
+    def __init__(self):
+        self.totals = {}
+        self.counts = {}
+
+    def add(self, category, raw_type, amount):
+        self.add_total(category, raw_type, amount, 1)
+
+    def add_total(self, category, raw_type, amount, count):
+        ''' Add a pre-aggregated total of count rows.'''
+        key = (category, raw_type)
+        self.totals[key] = self.totals.get(key, D(0)) + amount
+        self.counts[key] = self.counts.get(key, 0) + count
+
+    def select(self, values, categories=None, raw_type=None, exclude=()):
+        for (category, t), v in values.items():
+            if categories is not None and category not in categories:
+                continue
+            if category in exclude:
+                continue
+            if raw_type is not None and t != raw_type:
+                continue
+            yield v
+
+    def total(self, categories=None, raw_type=None, exclude=()):
+        result = D(0)
+        for v in self.select(self.totals, categories, raw_type, exclude):
+            result += v
+        return result
+
+    def count(self, categories=None, raw_type=None, exclude=()):
+        return sum(self.select(self.counts, categories, raw_type, exclude))
+
+
+def summarise(session, start_date=None, end_date=None):
+    summary = Summary()
+    if isinstance(RawData.__table__.c.amount.type, ScaledInteger):
+        # Amounts are integers, so sqlite can do the (exact) sums.
+        q = session.query(RawData.category, RawData.type,
+                          sqlalchemy.func.sum(RawData.amount),
+                          sqlalchemy.func.count(RawData.id))
+        q = filter_dates(q, RawData.ref_date, start_date, end_date)
+        for category, raw_type, amount, count in q.group_by(RawData.category, RawData.type):
+            summary.add_total(category, raw_type, amount, count)
+    else:
+        for i in stream_raw(session, start_date, end_date):
+            summary.add(i.category, i.type, i.amount)
+    return summary
+
+
+def print_totals(summary, trade_categories, out=sys.stdout):
+    ''' Print the summary totals.  Amounts in trade_categories are counted
+    as trades, anything not a trade or in CASH_CATEGORIES is "unknown".'''
+    s = summary
+    total_profit = s.total(trade_categories)
+    count_trades = s.count(trade_categories)
+    interest_long = s.total([RawData.CAT_INTEREST], "WITH")
+    interest_short = s.total([RawData.CAT_INTEREST], "DEPO")
+    commission = s.total([RawData.CAT_COMM])
+    other_comm = s.total([RawData.CAT_RISK])
+    xfee = s.total([RawData.CAT_XFEE])
+    dividends = s.total([RawData.CAT_DIVIDEND])
+    deposit = s.total([RawData.CAT_TRANSFER], "DEPO")
+    withdraw = s.total([RawData.CAT_TRANSFER], "WITH")
+    unknown = s.total(exclude=tuple(trade_categories) + CASH_CATEGORIES)
+    final_balance = s.total()
+
+    print("Total profit/loss:                      $%s" % (str(total_profit),), file=out)
+    print("Number of trades: ", count_trades, file=out)
+    print("\nInterest paid on long positions:        $%s\n"
+          "Interest earned on short positions:     $%s\n" % (str(interest_long), str(interest_short)), file=out)
+    print("Commissions:                            $%s\n"
+          "Guaranteed stop loss commissions:       $%s\n" % (str(commission), str(other_comm)), file=out)
+    print("ASX Exchange data fees:                 $%s\n\n"
+          "Total dividend adjustments:             $%s\n" % (str(xfee), str(dividends)), file=out)
+
+    print("Deposits:      $%s\nWithdrawals:   $%s" % (str(deposit), str(withdraw)), file=out)
+    print("Unknown:       $%s\n\nFINAL BALANCE: $%s" % (str(unknown), str(final_balance)), file=out)
+
+
+def print_legacy_summary(summary, out=sys.stdout):
+    print("CFD LEGACY SUMMARY\n", file=out)
+    # Legacy summary doesn't count index trades as trades.
+    print_totals(summary, [RawData.CAT_TRADE], out)
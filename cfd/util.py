@@ -22,9 +22,208 @@
 #
 
 from __future__ import division, unicode_literals, print_function
+import atexit
+import decimal
+import logging
 import datetime as dt
+import threading
+import Queue
 
 
 def mkdate(datestring):
     return dt.datetime.strptime(datestring, '%Y-%m-%d').date()
 
+
+
+# Keep IN (...) lists under SQLite's limit on bound parameters.
+MAX_IN_PARAMS = 900
+
+
+def chunks(seq, size=MAX_IN_PARAMS):
+    ''' Split seq into lists of at most size items.'''
+    seq = list(seq)
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+# Transaction files repeat the same few hundred dates, so parsed dates are
+# memoised.  The cache is simply emptied when it gets to DATE_CACHE_SIZE.
+DATE_CACHE_SIZE = 4096
+_ref_date_cache = {}
+
+
+def parse_ref_date(datestring):
+    ''' Parse DD/MM/YY date, same as strptime(datestring, '%d/%m/%y').'''
+    try:
+        return _ref_date_cache[datestring]
+    except KeyError:
+        pass
+    parts = datestring.split('/')
+    if len(parts) != 3:
+        raise ValueError("time data %r does not match format '%%d/%%m/%%y'"
+                         % datestring)
+    d, m, y = parts
+    if (len(y) == 2 and y.isdigit() and 0 < len(m) <= 2 and m.isdigit()
+            and 0 < len(d) <= 2 and d.isdigit()):
+        year = int(y)
+        year += 2000 if year < 69 else 1900
+        value = dt.date(year, int(m), int(d))
+    else:
+        value = dt.datetime.strptime(datestring, '%d/%m/%y').date()
+    if len(_ref_date_cache) >= DATE_CACHE_SIZE:
+        _ref_date_cache.clear()
+    _ref_date_cache[datestring] = value
+    return value
+
+
+LOG_LEVELS = ['debug', 'info', 'warning', 'error']
+
+# A warning (same format string) is logged the first REPEAT_BURST times,
+# then at most once every REPEAT_INTERVAL seconds, with a count of those
+# suppressed in between.
+REPEAT_BURST = 5
+REPEAT_INTERVAL = 10.0
+
+# Records are passed to the log writer thread in batches of up to
+# LOG_BATCH, or sooner for INFO and above, so it isn't woken for each one.
+LOG_BATCH = 200
+
+# Log record args of these types can't change after the logging call, so
+# the message can be formatted later, by the log writer thread.
+_IMMUTABLE_ARGS = (basestring, int, long, float, decimal.Decimal,
+                   dt.date, dt.time, dt.timedelta, type(None))
+
+
+class QueueHandler(logging.Handler):
+    ''' Puts lists of log records on a queue, for a QueueListener to write.'''
+    def __init__(self, queue, capacity=LOG_BATCH):
+        logging.Handler.__init__(self)
+        self.queue = queue
+        self.capacity = capacity
+        self.buffer = []
+
+    def prepare(self, record):
+        # Anything that could change before it's written is formatted now.
+        if record.args and (isinstance(record.args, dict) or not all(
+                isinstance(a, _IMMUTABLE_ARGS) for a in record.args)):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging._defaultFormatter.formatException(
+                                    record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.buffer.append(self.prepare(record))
+            if (len(self.buffer) >= self.capacity or
+                    record.levelno >= logging.INFO):
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        if self.buffer:
+            self.queue.put_nowait(self.buffer)
+            self.buffer = []
+
+
+class QueueListener(object):
+    ''' Thread writing log records from a queue to handlers.'''
+    def __init__(self, queue, handlers):
+        self.queue = queue
+        self.handlers = handlers
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='log writer')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        while True:
+            records = self.queue.get()
+            if records is None:
+                break
+            for record in records:
+                for h in self.handlers:
+                    if record.levelno >= h.level:
+                        h.handle(record)
+
+    def stop(self):
+        ''' Write any records still queued, then stop the thread.'''
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+
+class RepeatFilter(logging.Filter):
+    ''' Rate limits warnings with the same format string (see
+    REPEAT_BURST).'''
+    def __init__(self, burst=REPEAT_BURST, interval=REPEAT_INTERVAL):
+        logging.Filter.__init__(self)
+        self.burst = burst
+        self.interval = interval
+        # (logger name, format string) --> [count, suppressed, last logged]
+        self.seen = {}
+        self.last = (None, True)
+
+    def filter(self, record):
+        if record.levelno != logging.WARNING:
+            return True
+        # Several handlers can share the filter.
+        if record is self.last[0]:
+            return self.last[1]
+        key = (record.name, record.msg)
+        try:
+            s = self.seen[key]
+        except KeyError:
+            s = self.seen[key] = [0, 0, 0.0]
+        s[0] += 1
+        ok = s[0] <= self.burst or record.created - s[2] >= self.interval
+        if not ok:
+            s[1] += 1
+        else:
+            if s[1]:
+                record.msg = "%s [%d similar warnings suppressed]" % (
+                                record.getMessage(), s[1])
+                record.args = None
+                s[1] = 0
+            s[2] = record.created
+        self.last = (record, ok)
+        return ok
+
+    def log_suppressed(self):
+        ''' Log counts of warnings suppressed since each was last logged.'''
+        for key, s in self.seen.items():
+            if s[1]:
+                logging.getLogger().warning("%d more warnings like: %s",
+                                            s[1], key[1])
+                s[1] = 0
+
+
+def log_level(name):
+    ''' logging level for one of LOG_LEVELS.'''
+    return getattr(logging, name.upper())
+
+
+def add_log_handlers(handlers, background=False):
+    ''' Add handlers to the root logger, with repeated warnings rate
+    limited.  If background, records are written by a separate thread, so
+    logging calls don't wait for formatting and I/O (but each record costs
+    more, so it's only worth it when the handlers are slow).'''
+    repeats = RepeatFilter()
+    if background:
+        log_queue = Queue.Queue()
+        listener = QueueListener(log_queue, handlers)
+        handlers = [QueueHandler(log_queue)]
+        listener.start()
+        atexit.register(listener.stop)
+        atexit.register(handlers[0].flush)
+    for h in handlers:
+        h.addFilter(repeats)
+        logging.getLogger().addHandler(h)
+    # Run before the flush and listener.stop (atexit is last in, first out).
+    atexit.register(repeats.log_suppressed)
@@ -21,10 +21,12 @@
 #
 # Entries not reconcilled will be output on stderr.
 #
+# Use --stream for input files too big to keep all closed trades in memory.
+#
 
 
 import csv, sys, struct
-#from decimal import *
+from decimal import Decimal, ROUND_HALF_EVEN
 from datetime import date
 
 class ConfigOptions:
@@ -40,6 +42,54 @@ g_config.start_date = date(2008, 7, 1)
 g_config.end_date = date(2009, 6, 30)
 #g_config.start_date = date(2009, 7, 1)
 #g_config.end_date = date(2010, 6, 30)
+#
+# Streaming mode writes each closed position as soon as it closes, and
+# keeps only open positions in memory (closed positions discarded by the
+# date filter are just counted).  Output rows are in the order positions
+# close, rather than sorted.  Can also be set with --stream.
+#
+g_config.streaming = False
+if '--stream' in sys.argv[1:]:
+    g_config.streaming = True
+
+
+#
+# Money is held as an integer number of 10**-MONEY_SCALE units, so sums and
+# price * quantity are exact and fast.  Decimal is only used to parse
+# values with more than MONEY_SCALE decimal places; output is formatted
+# with integer arithmetic.
+#
+MONEY_SCALE = 6
+MONEY_UNIT = 10 ** MONEY_SCALE
+CENT_UNITS = MONEY_UNIT // 100
+
+def parse_money(s):
+    whole, point, frac = s.strip().partition('.')
+    if len(frac) <= MONEY_SCALE:
+        try:
+            return int(whole + frac.ljust(MONEY_SCALE, '0'))
+        except ValueError:
+            pass
+    # More decimal places than MONEY_SCALE, exponent, etc.
+    value = Decimal(s.strip()).scaleb(MONEY_SCALE)
+    return int(value.to_integral_value(ROUND_HALF_EVEN))
+
+
+def money_str(units):
+    ''' Exact value, with at least 2 decimal places.'''
+    whole, frac = divmod(abs(units), MONEY_UNIT)
+    frac = ('%0*d' % (MONEY_SCALE, frac)).rstrip('0')
+    return '%s%d.%s' % ('-' if units < 0 else '', whole, frac.ljust(2, '0'))
+
+
+def money_cents(units):
+    ''' Rounded to cents, halves away from zero.'''
+    cents, rest = divmod(abs(units), CENT_UNITS)
+    if rest * 2 >= CENT_UNITS:
+        cents += 1
+    whole, cents = divmod(cents, 100)
+    return '%s%d.%02d' % ('-' if units < 0 and (whole or cents) else '',
+                          whole, cents)
 
 
 def parse_date_string(str):
@@ -70,7 +120,10 @@ I_BROKERAGE     = 6
 I_TOTAL         = 7
 I_ID            = 0
 
-class RawTrade:
+class RawTrade(object):
+    __slots__ = ('id', 'date', 'type', 'symbol', 'qty', 'price', 'brokerage',
+                 'total')
+
     def __str__(self):
         if (self.type[0] == "B"):
             tdesc = "BUY"
@@ -78,11 +131,18 @@ class RawTrade:
             tdesc = "SELL"
         else:
             tdesc = "ERROR: INVALID TRADE TYPE"
+        # Formatted as a float, exactly as when prices were floats.
         return '%4s %6i %4s @ %6.2f on %11s' % \
-               (tdesc, self.qty, self.symbol, self.price, self.date)
+               (tdesc, self.qty, self.symbol, float(self.price) / MONEY_UNIT,
+                self.date)
+
 
+class TradePosition(object):
+    __slots__ = ('symbol', 'trade_list', 'qty', 'open_date', 'close_date',
+                 'buy_total_price', 'buy_price', 'buy_qty',
+                 'sell_total_price', 'sell_price', 'sell_qty',
+                 'gross_profit', 'total_brokerage')
 
-class TradePosition:
     def __init__(self, symbol):
         self.symbol = symbol
         self.trade_list = []
@@ -141,10 +201,10 @@ class TradePosition:
     def summary_data(self):
         self.calc_trade_data()
         return [str(self.close_date), str(self.open_date), self.symbol,
-                str(self.buy_price), str(self.buy_qty), 
-                str(self.buy_total_price), str(self.sell_price), 
-                str(self.sell_qty), str(self.sell_total_price),
-                str(self.gross_profit)]
+                money_str(self.buy_price), str(self.buy_qty),
+                money_str(self.buy_total_price), money_str(self.sell_price),
+                str(self.sell_qty), money_str(self.sell_total_price),
+                money_str(self.gross_profit)]
 
 #
 # Globals
@@ -152,118 +212,141 @@ class TradePosition:
 g_open_trades = {}
 g_closed_trades = []
 g_discard_date = []
+g_closed_count = 0
+g_discard_count = 0
+g_total_gross_profit = 0
+g_total_brokerage = 0
+
+
+def write_closed_position(writer, pos):
+    global g_closed_count, g_total_gross_profit, g_total_brokerage
+    out = pos.summary_data();
+    g_closed_count += 1
+    g_total_gross_profit += pos.gross_profit
+    g_total_brokerage += pos.total_brokerage
+    print out
+    writer.writerow(out)
 
 
-filename = "csin.csv"
-reader = csv.reader(open(filename, "rb"))
-line_num = 0
-print 'Opening input file...processing...'
-print '=================================================='
+if __name__ == "__main__":
+    filename = "csin.csv"
+    reader = csv.reader(open(filename, "rb"))
+    writer = csv.writer(open("csout.csv", "wb"))
+    line_num = 0
+    print 'Opening input file...processing...'
+    print '=================================================='
 
-try:
-    reader.next();       # skip header
-    line_num += 1
-    for row in reader:
+    try:
+        reader.next();       # skip header
         line_num += 1
-        is_okay = True
-        t = RawTrade()
-        t.symbol 	=  row[I_SYMBOL].strip()
-        t.date 		=  parse_date_string(row[I_DATE])
-        t.type 		=  row[I_TYPE]
-        t.qty  		=  int(row[I_QTY])
-        t.price 	=  float(row[I_PRICE])
-        t.brokerage     =  float(row[I_BROKERAGE])
-        t.total 	=  float(row[I_TOTAL])
-        t.id 		=  row[I_ID]
-        if (t.type[0] == "S"):
-            t.qty *= -1
-        elif (t.type[0] != "B"):
-            sys.stderr.write('Invalid Trade Type for %s at line %d\n' %
-                             (t.symbol, line_num))
-            is_okay = False
-        if (t.qty == 0):
-            sys.stderr.write('Zero quantity trade for %s at line %d\n' %
-                             (t.symbol, line_num))
-            is_okay = False
-            
-        if (not is_okay):
-            pass
-        elif (t.symbol in g_open_trades):
-            position = g_open_trades[t.symbol]
-            position.add_trade(t)
-            if (position.is_closed()):
-                print '%5d: CLOSE %s' % (line_num, str(t))
-                if (not g_config.date_range_filter or (position.close_date >=
-                                                       g_config.start_date and
-                                                       position.close_date <=
-                                                       g_config.end_date)):
-                    g_closed_trades.append(position)
+        for row in reader:
+            line_num += 1
+            is_okay = True
+            t = RawTrade()
+            t.symbol 	=  row[I_SYMBOL].strip()
+            t.date 		=  parse_date_string(row[I_DATE])
+            t.type 		=  row[I_TYPE]
+            t.qty  		=  int(row[I_QTY])
+            t.price 	=  parse_money(row[I_PRICE])
+            t.brokerage     =  parse_money(row[I_BROKERAGE])
+            t.total 	=  parse_money(row[I_TOTAL])
+            t.id 		=  row[I_ID]
+            if (t.type[0] == "S"):
+                t.qty *= -1
+            elif (t.type[0] != "B"):
+                sys.stderr.write('Invalid Trade Type for %s at line %d\n' %
+                                 (t.symbol, line_num))
+                is_okay = False
+            if (t.qty == 0):
+                sys.stderr.write('Zero quantity trade for %s at line %d\n' %
+                                 (t.symbol, line_num))
+                is_okay = False
+
+            if (not is_okay):
+                pass
+            elif (t.symbol in g_open_trades):
+                position = g_open_trades[t.symbol]
+                position.add_trade(t)
+                if (position.is_closed()):
+                    print '%5d: CLOSE %s' % (line_num, str(t))
+                    if (not g_config.date_range_filter or (position.close_date >=
+                                                           g_config.start_date and
+                                                           position.close_date <=
+                                                           g_config.end_date)):
+                        if (g_config.streaming):
+                            write_closed_position(writer, position)
+                        else:
+                            g_closed_trades.append(position)
+                    elif (g_config.streaming):
+                        g_discard_count += 1
+                    else:
+                        g_discard_date.append(position)
+                    del g_open_trades[t.symbol]
+                elif (t.qty > 0):
+                    print '%5d: +++++ %s' % (line_num, str(t))
                 else:
-                    g_discard_date.append(position)
-                del g_open_trades[t.symbol]
-            elif (t.qty > 0):
-                print '%5d: +++++ %s' % (line_num, str(t))
+                    print '%5d: ----- %s' % (line_num, str(t))
             else:
-                print '%5d: ----- %s' % (line_num, str(t))
+                print '%5d: OPEN  %s' % (line_num, str(t))
+                if (t.qty < 0 and not g_config.short_selling_allowed):
+                    sys.stderr.write('       ERROR: Attempting to short sell '
+                                     '%s at line %d\n' % (t.symbol, line_num))
+                    is_okay = False
+                else:
+                    ot = TradePosition(t.symbol)
+                    ot.add_trade(t)
+                    g_open_trades[t.symbol] = ot
+    except csv.Error, e:
+        sys.exit('file %s, line %d: %s' % (filename, reader.line_num, e))
+
+
+    print
+    print '=================================================='
+    print '*** Processing Completed ***'
+    print '=================================================='
+    print
+    print 'There are %d remaining open trades.' % (len(g_open_trades))
+    if (len(g_open_trades) > 0):
+        for v in g_open_trades.itervalues():
+            print v.summary_data()
+    print
+    print '=================================================='
+    print 
+
+    if (g_config.date_range_filter):
+        if (g_config.streaming):
+            print ('%d closed trades were discarded due to the date filter.' %
+                   (g_discard_count))
         else:
-            print '%5d: OPEN  %s' % (line_num, str(t))
-            if (t.qty < 0 and not g_config.short_selling_allowed):
-                sys.stderr.write('       ERROR: Attempting to short sell '
-                                 '%s at line %d\n' % (t.symbol, line_num))
-                is_okay = False
-            else:
-                ot = TradePosition(t.symbol)
-                ot.add_trade(t)
-                g_open_trades[t.symbol] = ot
-except csv.Error, e:
-    sys.exit('file %s, line %d: %s' % (filename, reader.line_num, e))
-
-
-print
-print '=================================================='
-print '*** Processing Completed ***'
-print '=================================================='
-print
-print 'There are %d remaining open trades.' % (len(g_open_trades))
-if (len(g_open_trades) > 0):
-    for v in g_open_trades.itervalues():
-        print v.summary_data()
-print
-print '=================================================='
-print 
-
-if (g_config.date_range_filter):
-    print ('%d closed trades were discarded due to the date filter:\n' %
-           (len(g_discard_date)))
-    if (len(g_discard_date) > 0):
-        for pos in g_discard_date:
-            print pos.summary_data()
-    print '\n=================================================='
-print
-print 'There are %d closed trades.\n' % (len(g_closed_trades))
+            print ('%d closed trades were discarded due to the date filter:\n' %
+                   (len(g_discard_date)))
+            if (len(g_discard_date) > 0):
+                for pos in g_discard_date:
+                    print pos.summary_data()
+        print '\n=================================================='
+    print
 
-#
-# Sort just in case, but should be in the correct order since the input file
-# must be in chronological order for correct results.
-#
-g_closed_trades.sort(cmp_trade_position)
+    if (not g_config.streaming):
+        print 'There are %d closed trades.\n' % (len(g_closed_trades))
 
-total_gross_profit = 0
-total_brokerage = 0
-writer = csv.writer(open("csout.csv", "wb"))
-for pos in g_closed_trades:
-    out = pos.summary_data();
-    total_gross_profit += pos.gross_profit
-    total_brokerage += pos.total_brokerage
-    print out
-    writer.writerow(out)
+        #
+        # Sort just in case, but should be in the correct order since the input
+        # file must be in chronological order for correct results.
+        #
+        g_closed_trades.sort(cmp_trade_position)
+
+        for pos in g_closed_trades:
+            write_closed_position(writer, pos)
+    else:
+        print 'There were %d closed trades.' % (g_closed_count)
 
 
-print '\n=================================================='
-print '\nSummary\n'
-print 'Total Gross Profit/Loss: %10.2f' % total_gross_profit
-print 'Total Brokerage:         %10.2f' % total_brokerage
-print 'Total Net Profit/Loss:   %10.2f' % (total_gross_profit - total_brokerage)
-print 
-print '=================================================='
-print
+    print '\n=================================================='
+    print '\nSummary\n'
+    print 'Total Gross Profit/Loss: %10s' % money_cents(g_total_gross_profit)
+    print 'Total Brokerage:         %10s' % money_cents(g_total_brokerage)
+    print 'Total Net Profit/Loss:   %10s' % money_cents(g_total_gross_profit -
+                                                      g_total_brokerage)
+    print 
+    print '=================================================='
+    print
@@ -5,52 +5,128 @@
 # by Robert Iwancz <robulouski@gmail.com>
 # Last updated Apr 2013
 #
-# Takes CSV file with a date/datetime field in US format: 
-#   MM/DD/YYYY <optional-time-part> 
-# and converts date field to sane format: 
-#   DD/MM/YYY <optional-time-part>
+# Takes CSV file with date/datetime fields in US format:
+#   MM/DD/YYYY <optional-time-part>
+# and converts date fields to sane format:
+#   DD/MM/YYYY <optional-time-part>
 # If there's any text after the date, it's included in the results unmodified,
 # so should work for both date and date-time fields.
 # Assumes:
 # - comma seperator
-# - first line in file is header, and discarded, so output is without header.
+# - first line in file is header, and discarded, so output is without header
+#   (unless --header).
+#
+# Usage: csv_us2au_date.py <inputfile> <outputfile> <fieldindex> [...]
+#
+# Any number of field indexes can be given, and are all converted in one
+# pass.  Use - for stdin/stdout, e.g.
+#
+#   csv_us2au_date.py - - 7 < activity.csv | tac > activity_datefixed_rev.csv
+#
+# Fields that aren't a date are reported (on stderr) and left unchanged.
 #
 
-import sys
+from __future__ import division, print_function
+import io
 import re
+import sys
 import csv
+import time
+import argparse
 
 
-if (len(sys.argv) > 3):
-    input_filename = sys.argv[1]
-    print "Using input file:", input_filename
-    output_filename = sys.argv[2]
-    print "Using output file:", output_filename
-    field_index = int(sys.argv[3])
-else:
-    sys.exit("Usage: csv_us2au_date.py <inputfile> <outputfile> <fieldindex>")
-
+BUFFER_SIZE = 1024 * 1024
+WRITE_BATCH = 10000
 
 prog = re.compile(r'(\d+)/(\d+)/(\d+)(.*)')
 
-of = open(output_filename, "wb")
 
-with open(input_filename, 'rb') as csvfile:
-    writer = csv.writer(of)
-    reader = csv.reader(csvfile)
-    next(csvfile) 	# skip first line!
+def convert_date(v):
+    ''' Returns converted date string, or None if v isn't a date.'''
+    # Fast path for the usual MM/DD/YYYY[ time].
+    if (len(v) >= 10 and v[2] == '/' and v[5] == '/' and
+            v[0:2].isdigit() and v[3:5].isdigit() and v[6:10].isdigit() and
+            v[6] != '0' and (len(v) == 10 or not v[10].isdigit())):
+        return v[3:5] + '/' + v[0:2] + '/' + v[6:]
+    m = prog.search(v)
+    if m is None:
+        return None
+    return "%02d/%02d/%d%s" % (int(m.group(2)), int(m.group(1)),
+                               int(m.group(3)), m.group(4))
+
+
+def open_input(filename):
+    if filename == '-':
+        return io.open(sys.stdin.fileno(), 'rb', BUFFER_SIZE, closefd=False)
+    return io.open(filename, 'rb', BUFFER_SIZE)
 
+
+def open_output(filename):
+    if filename == '-':
+        return io.open(sys.stdout.fileno(), 'wb', BUFFER_SIZE, closefd=False)
+    return io.open(filename, 'wb', BUFFER_SIZE)
+
+
+def report(count, start):
+    elapsed = time.time() - start
+    sys.stderr.write("%d rows in %.1f seconds (%d rows/sec)\n" %
+                     (count, elapsed, count / elapsed if elapsed else 0))
+
+
+def convert(infile, outfile, fields, keep_header=False, progress=0):
+    ''' Returns number of rows converted (excluding header).'''
+    reader = csv.reader(infile)
+    writer = csv.writer(outfile)
+    header = next(reader, None)
+    if header is not None and keep_header:
+        writer.writerow(header)
+
+    start = time.time()
+    count = 0
+    next_report = progress
+    batch = []
     for row in reader:
-        m = prog.search(row[field_index])
-        if m is None:
-            print "INVALID DATE AT LINE %d" % (reader.line_num)
-            v = row[field_index]
-            row[field_index] = '"' + v + '"'
-        else:
-            row[field_index] = "%02d/%02d/%d" % (int(m.group(2)), 
-                                                 int(m.group(1)), 
-                                                 int(m.group(3)))
-            if m.group(4):
-                row[field_index] += m.group(4)
-        writer.writerow(row)
+        for i in fields:
+            v = convert_date(row[i])
+            if v is None:
+                sys.stderr.write("INVALID DATE AT LINE %d\n" %
+                                 (reader.line_num))
+            else:
+                row[i] = v
+        batch.append(row)
+        if len(batch) >= WRITE_BATCH:
+            writer.writerows(batch)
+            count += len(batch)
+            batch = []
+            if progress and count >= next_report:
+                report(count, start)
+                next_report += progress
+    writer.writerows(batch)
+    count += len(batch)
+    report(count, start)
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='csv_us2au_date: convert US '
+                                     'format dates in CSV file to DD/MM/YYYY')
+    parser.add_argument('--header', action='store_true',
+                        help='copy header line to output instead of discarding it')
+    parser.add_argument('--progress', type=int, default=1000000, metavar='ROWS',
+                        help='report rows/sec every ROWS rows, 0 for only at '
+                        'the end (default %(default)d)')
+    parser.add_argument('INPUT', help='input CSV file, or - for stdin')
+    parser.add_argument('OUTPUT', help='output CSV file, or - for stdout')
+    parser.add_argument('FIELD', type=int, nargs='+',
+                        help='index of date field to convert (from 0)')
+    args = parser.parse_args()
 
+    sys.stderr.write("Using input file: %s\n" % args.INPUT)
+    sys.stderr.write("Using output file: %s\n" % args.OUTPUT)
+    infile = open_input(args.INPUT)
+    outfile = open_output(args.OUTPUT)
+    try:
+        convert(infile, outfile, args.FIELD, args.header, args.progress)
+    finally:
+        outfile.close()
+        infile.close()
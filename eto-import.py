@@ -24,6 +24,10 @@
 # Takes options transactions in a CSV input file, stores the data in an 
 # (sqlite) database.
 #
+# Input can be several files, directories (all *.csv files in them) or glob
+# patterns.  With more than one file, files are parsed in parallel (--jobs),
+# but imported in the order given, in one transaction.
+#
 # Current deficiencies:
 #  - very quick and dirty, minimal error checking
 #  - doesn't handle equities, or exercised options!
@@ -34,37 +38,72 @@
 import sys
 import logging
 import datetime
-import csv
-import sqlalchemy
+import argparse
+import multiprocessing
 
 from eto.util import init_logging
-from eto.models import OptionActivity, ModelsError, db_get_session
+from cfd.util import log_level, LOG_LEVELS
+from cfd import sqlstats
+from cfd.importfile import input_files, parsed_files
 
 
-init_logging(logging.DEBUG)
 logger = logging.getLogger(__file__)
-logger.info("IMPORTING ETO DATA: " + str(datetime.datetime.now()))
 
-if (len(sys.argv) > 1):
-    input_filename = sys.argv[1]
-    logger.info("Using input file: " + input_filename)
-else:
-    sys.exit("Usage: import_activity.py <inputfile>")
+
+def parse_row(filename, line_num, row):
+    """(line number, first 3 fields, parse_list() tuple, error message) for
+    a row, with either the values or the error message None."""
+    try:
+        return line_num, row[:3], OptionActivity.parse_list(row), None
+    except ModelsError as e:
+        return line_num, row[:3], None, e.msg
 
 
-session = db_get_session()
+@sqlstats.stage('import')
+def import_activities(session, files, jobs):
+    # Files are imported in the order given, whichever finishes parsing
+    # first.
+    for filename, rows in parsed_files(files, jobs, parse_row):
+        logger.info("Using input file: " + filename)
+        for line_num, fields, values, error in rows:
+            logger.debug("[%s %s %s]", *fields)
+            if error is None:
+                a = OptionActivity()
+                a.init_from_values(values)
+                session.add(a)
+            else:
+                logger.error("****** ACTIVITY ERROR AT LINE %d" % (line_num))
+                logger.error("****** " + error)
 
-with open(input_filename, 'rb') as csvfile:
-    reader = csv.reader(csvfile)
 
-    for row in reader:
-        logger.debug("[%s %s %s]", row[0], row[1], row[2])
-        try:
-            a = OptionActivity(row)
-            session.add(a)
-        except ModelsError as e:
-            logger.error("****** ACTIVITY ERROR AT LINE %d" % (reader.line_num))
-            logger.error("****** " + e.msg)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='eto-import: Import option activity data files')
+    parser.add_argument('--jobs', type=int, default=multiprocessing.cpu_count(),
+                        help='processes used to parse multiple files (default %(default)d)')
+    parser.add_argument('FILE', nargs='+',
+                        help='input CSV file, directory or glob pattern, or - for stdin')
+    parser.add_argument('--sql-stats', action='store_true',
+                        help='report SQL statements, rows and time per stage '
+                        '(same as setting %s=1)' % sqlstats.ENV_VAR)
+    parser.add_argument('--log-level', choices=LOG_LEVELS, default='info',
+                        help='log level (default %(default)s)')
+    parser.add_argument('--log-file', help='also log to this file')
+    parser.add_argument('--background-log', action='store_true',
+                        help='write log messages from a background thread, '
+                        'instead of as they are logged')
+    args = parser.parse_args()
+    # Load the models (and SQLAlchemy) only once the arguments are OK.
+    from eto.models import OptionActivity, ModelsError, db_get_session, enable_sql_stats
+    if args.sql_stats:
+        enable_sql_stats()
+    init_logging(log_level(args.log_level), args.log_file, args.background_log)
 
+    logger.info("IMPORTING ETO DATA: " + str(datetime.datetime.now()))
+    files = input_files(args.FILE)
+    if '-' in files and len(files) > 1:
+        sys.exit("Can't use - (stdin) with other input files")
 
-session.commit()
+    session = db_get_session()
+    import_activities(session, files, args.jobs)
+    with sqlstats.stage('commit'):
+        session.commit()
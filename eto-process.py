@@ -38,28 +38,99 @@ import sys
 import logging
 import datetime
 import decimal
-import sqlalchemy
+import time
+import argparse
 
 from eto.util import init_logging
-from eto.models import OptionTrade, OptionActivity, ActionType, TradeStatus
-from eto.models import db_refresh_trades, db_get_session
+from cfd.util import log_level, LOG_LEVELS
+from eto.config import g_config
+from cfd import sqlstats
 
 logger = logging.getLogger(__file__)
 
-def gen_trades():
+
+def link_activities(session, links):
+    """
+    Set trade_id for a list of (activity, trade) pairs, in one bulk update.
+    The trades must have been flushed already, so they have ids.
+    """
+    if not links:
+        return
+    t = OptionActivity.__table__
+    stmt = t.update().where(t.c.id==sqlalchemy.bindparam('b_id')).values(
+                            trade_id=sqlalchemy.bindparam('b_trade_id'))
+    session.execute(stmt, [{'b_id': a.id, 'b_trade_id': trade.id}
+                           for a, trade in links])
+
+
+class ExitPrices(object):
+    """
+    Running totals of the closing activities of each trade (sells, and
+    exercises at their price of 0), kept while matching, so exit prices for
+    trades with multiple closes can be averaged without reading the
+    activities back.
+    """
+
+    def __init__(self):
+        # trade --> [count, sum of prices, sum of quantities, sum of quantity * price]
+        self.totals = {}
+
+    def add(self, t, a):
+        D = decimal.Decimal
+        tot = self.totals.setdefault(t, [0, D(0), D(0), D(0)])
+        tot[0] += 1
+        tot[1] += a.price
+        tot[2] += a.quantity
+        tot[3] += a.quantity * a.price
+
+    def adjust(self, t, weighted=False):
+        """
+        Set exit price of trade to the average of its closing prices,
+        either a simple mean of the parcel prices, or weighted by quantity.
+        """
+        tot = self.totals.get(t)
+        if tot is None:
+            logger.error("*** No closing trades found!!! ******")
+            return
+        if tot[0] != t.num_closes:
+            logger.error("*** Number of closing trades does not match "
+                         "num_closes value!!! ******")
+        if weighted and tot[2] == 0:
+            logger.error("*** Closing quantity is zero, using simple mean "
+                         "exit price ******")
+            weighted = False
+        if weighted:
+            t.exit_price = tot[3] / tot[2]
+        else:
+            t.exit_price = tot[1] / tot[0]
+
+
+@sqlstats.stage('gen_trades')
+def gen_trades(commit_interval=0, weighted_exit=False):
     session = db_get_session()
+    # Objects loaded here are only changed here, so don't reload them all
+    # after every (interval) commit.
+    session.expire_on_commit = False
+    # symbol --> currently open trade
+    open_trades = {}
+    # (activity, trade) pairs waiting for trade ids
+    links = []
+    trades = []
+    exit_prices = ExitPrices()
+    count = 0
+    start_time = time.time()
 
     for i in session.query(OptionActivity).order_by(OptionActivity.ref_date): 
         if i.action_id == ActionType.BUY_TO_OPEN:
             logger.debug("OPENING OPTION TRADE: %s %s", i.symbol, i.description)
-            q = session.query(OptionTrade).filter(
-                    OptionTrade.status_id==TradeStatus.OPEN).filter(
-                    OptionTrade.symbol==i.symbol)
-            t = q.first()
+            t = open_trades.get(i.symbol)
             if (t is None):
                 t = OptionTrade(i.symbol, i.description, i.ref_date)
                 # TODO: need to adjust this later if there are  multiple entries.
                 t.entry_price = i.price
+                session.add(t)
+                open_trades[i.symbol] = t
+                trades.append(t)
             else:
                 logger.debug("*************** EXISTING OPEN TRADE  "
                              "**********************")
@@ -70,16 +141,10 @@ def gen_trades():
             t.fees += i.fees
             t.net_total_cost += (i.net_total_cost * -1)
             t.gross_total_cost += (i.gross_total_cost * -1)
-            session.add(t)
-            session.commit()
-            i.trade_id = t.id
-            session.commit()
+            links.append((i, t))
         elif i.is_closing_action():
             logger.debug("CLOSING OPTION TRADE: %s %s", i.symbol, i.description)
-            q = session.query(OptionTrade).filter(
-                    OptionTrade.status_id==TradeStatus.OPEN).filter(
-                    OptionTrade.symbol==i.symbol)
-            t = q.first()
+            t = open_trades.get(i.symbol)
             if (t is None):
                 logger.error("***  NO EXISTING OPEN TRADE FOUND "
                              "FOR CLOSING TRADE!  **********************")
@@ -93,6 +158,7 @@ def gen_trades():
                     logger.debug("\tTRADE CLOSED")
                     t.status_id = TradeStatus.CLOSED
                     t.close_date = i.ref_date
+                    del open_trades[i.symbol]
                 else:
                     logger.warn("*** Trade not yet closed, "
                                  "could have multiple parcels. ***********")
@@ -103,41 +169,69 @@ def gen_trades():
                 t.fees += i.fees
                 t.net_total_cost += i.net_total_cost
                 t.gross_total_cost += i.gross_total_cost
-                i.trade_id = t.id
-                session.commit()
+                links.append((i, t))
+                exit_prices.add(t, i)
         else:
             logger.debug("\tTODO: %s %s", i.symbol, i.description)
 
+        count += 1
+        if commit_interval and count % commit_interval == 0:
+            session.flush()
+            link_activities(session, links)
+            links = []
+            session.commit()
+
     #
     # Find any trades with more than one closing trade, and adjust exit price.
     #
-    for t in session.query(OptionTrade).filter(
-                OptionTrade.status_id==TradeStatus.CLOSED).filter(
-                OptionTrade.num_closes>1):
-        logger.debug("*** Adjusting exit price, %d closes for OPTION trade: %s %s",
-                     t.num_closes, t.symbol, t.description)
-        q = session.query(OptionActivity).filter(
-            OptionActivity.action_id==ActionType.SELL_TO_CLOSE).filter(
-            OptionActivity.trade_id==t.id)
-        l = q.all()
-        if len(l) == 0:
-            logger.error("*** No closing trades found!!! ******")
-            continue     
-        if len(l) != t.num_closes:
-            logger.error("*** Number of closing trades does not match "
-                         "num_closes value!!! ******")
-        t.exit_price = decimal.Decimal(0)
-        for a in l:
-            t.exit_price += a.price
-        t.exit_price /= t.num_closes
+    for t in trades:
+        if t.status_id == TradeStatus.CLOSED and t.num_closes > 1:
+            logger.debug("*** Adjusting exit price, %d closes for OPTION trade: %s %s",
+                         t.num_closes, t.symbol, t.description)
+            exit_prices.adjust(t, weighted_exit)
+
+    with sqlstats.stage('flush'):
+        session.flush()
+    with sqlstats.stage('link'):
+        link_activities(session, links)
+    with sqlstats.stage('commit'):
         session.commit()
+    elapsed = time.time() - start_time
+    logger.info("Processed %d activities in %.2f seconds (%.0f rows/sec)",
+                count, elapsed, count / elapsed if elapsed > 0 else 0)
 
 
 if __name__ ==  "__main__":
-    loglevel = logging.DEBUG
-    init_logging(loglevel)
+    parser = argparse.ArgumentParser(description='eto-process: Match option activities into trades')
+    parser.add_argument('--commit-interval', type=int,
+                        default=g_config.process_commit_interval,
+                        help='commit every N activities (default: single transaction)')
+    parser.add_argument('--weighted-exit', action='store_true',
+                        default=(g_config.exit_price_average == 'weighted'),
+                        help='average exit price of multiple closes weighted by quantity')
+    parser.add_argument('--sql-stats', action='store_true',
+                        help='report SQL statements, rows and time per stage '
+                        '(same as setting %s=1)' % sqlstats.ENV_VAR)
+    parser.add_argument('--log-level', choices=LOG_LEVELS, default='info',
+                        help='log level (default %(default)s)')
+    parser.add_argument('--log-file', help='also log to this file')
+    parser.add_argument('--background-log', action='store_true',
+                        help='write log messages from a background thread, '
+                        'instead of as they are logged')
+    args = parser.parse_args()
+    if args.commit_interval < 0:
+        sys.exit("Invalid commit interval")
+    # Load the models (and SQLAlchemy) only once the arguments are OK.
+    import sqlalchemy
+    from eto.models import OptionTrade, OptionActivity, ActionType, TradeStatus
+    from eto.models import db_refresh_trades, db_get_session, enable_sql_stats
+    if args.sql_stats:
+        enable_sql_stats()
+
+    init_logging(log_level(args.log_level), args.log_file, args.background_log)
     logger.info("ETO PROCESSING: " + str(datetime.datetime.now()))
-    db_refresh_trades()
-    gen_trades()
+    with sqlstats.stage('refresh'):
+        db_refresh_trades()
+    gen_trades(args.commit_interval, args.weighted_exit)
     logger.info("END (ETO PROCESSING) " + str(datetime.datetime.now()))
 
@@ -0,0 +1,89 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# cache.py: Closed option trades (with their activities) held in memory, so
+# report-server.py can generate trade events for any date range without
+# going back to the database.
+#
+# Output is the same as eto-csv-export.py for the same dates.
+#
+
+from __future__ import division, print_function
+import time
+import logging
+
+from eto.models import get_engine, db_get_session
+from eto.config import g_config
+from cfd.cacheutil import DataVersion, load_cache
+from eto.export import get_trades, cmp_trade_data_close_date
+
+logger = logging.getLogger(__name__)
+
+
+class EventCache(object):
+    """
+    All closed trades, sorted by close date, as eto-csv-export.py sorts
+    the trades for a date range.
+    """
+
+    def __init__(self):
+        self.closed_trades = []
+        # trade id --> all of its trade events, generated when first needed
+        self.events = {}
+        self.seconds = 0.0
+
+    def load(self, session):
+        start_time = time.time()
+        self.closed_trades = get_trades(session)
+        self.closed_trades.sort(cmp_trade_data_close_date)
+        self.seconds = time.time() - start_time
+        logger.info("Loaded %d closed trades in %.2f seconds",
+                    len(self.closed_trades), self.seconds)
+
+    def trade_events(self, start_date=None, end_date=None):
+        """
+        Trade events in the date range.  Like get_trades(), only trades with
+        a closing activity in the range are used.  A trade's events don't
+        depend on the range (only which of them are used), so they're only
+        generated once.
+        """
+        def in_range(d):
+            return ((start_date is None or d.date() >= start_date) and
+                    (end_date is None or d.date() <= end_date))
+
+        trade_events = []
+        for td in self.closed_trades:
+            if start_date is not None or end_date is not None:
+                if not any(in_range(c.ref_date) for c in td.close_acts):
+                    continue
+            events = self.events.get(td.trade_id)
+            if events is None:
+                events = self.events[td.trade_id] = []
+                td.get_raw_events(events)
+            trade_events.extend(te for te in events if in_range(te.close_date))
+        return trade_events
+
+
+def data_version():
+    return DataVersion(get_engine(), g_config.is_sqlite())
+
+
+def load():
+    return load_cache(EventCache(), db_get_session())
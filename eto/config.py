@@ -0,0 +1,57 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# config.py
+#
+
+import os
+
+
+class Config(object):
+    def __init__(self):
+        # Can be overridden by the TH_ETO_DB environment variable (e.g.
+        # trade-herder.py --db).
+        self.db_connect_str = os.environ.get('TH_ETO_DB', 'sqlite:///theto.db')
+        # How money/quantity columns are stored in sqlite: 'string' (decimal
+        # strings) or 'scaled' (integer units of 10**-currency_scale).
+        # Existing databases need to be converted with eto-migrate-db.py.
+        self.currency_storage = 'string'
+        self.currency_scale = 6
+        # Activities processed per commit in eto-process.py (0 = single commit).
+        self.process_commit_interval = 0
+        # Exit price for trades closed in multiple parcels: 'simple' (mean
+        # of parcel prices) or 'weighted' (weighted by parcel quantity).
+        self.exit_price_average = 'simple'
+        # PRAGMAs run on each new sqlite connection, in order.  Set to []
+        # for sqlite's defaults.  WAL with synchronous=NORMAL only syncs at
+        # checkpoints; cache_size is in KiB when negative.
+        self.sqlite_pragmas = [('journal_mode', 'WAL'),
+                               ('synchronous', 'NORMAL'),
+                               ('cache_size', -65536),
+                               ('mmap_size', 268435456)]
+        # With --sql-stats (or TH_SQL_STATS=1), statements run more than
+        # this many times in one stage are reported as possible N+1 queries.
+        self.sql_stats_repeat_limit = 50
+    
+    def is_sqlite(self):
+        return self.db_connect_str.startswith('sqlite')
+
+
+g_config = Config()
@@ -0,0 +1,409 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# export.py: Option trade events, for eto-csv-export.py and report-server.py
+#
+# Current deficiencies:
+#  - quick and dirty, fairly minimal error checking
+#  - doesn't handle equities, or exercised options!
+#  - correctly handles multiple closes for a trade (i.e. taking partial 
+#    profit/loss), but not multiple entries.
+#
+
+from __future__ import division, print_function
+import sys
+import csv
+import logging
+import datetime as dt
+
+from eto.models import OptionTrade, OptionActivity, ActionType, TradeStatus
+from cfd import sqlstats
+
+
+def cmp_trade_data_open_date(l, r):
+    if (l.trade.open_date < r.trade.open_date):
+        return -1
+    elif (l.trade.open_date > r.trade.open_date):
+        return 1
+    else:
+        return 0
+
+
+def cmp_trade_data_close_date(l, r):
+    if (l.trade.close_date < r.trade.close_date):
+        return -1
+    elif (l.trade.close_date > r.trade.close_date):
+        return 1
+    else:
+        return 0
+
+
+RAW_COL_HEADINGS = [
+    'Open Date',
+    'Quantity',
+    'Symbol',
+    'Description',
+    'Open Price',
+    'Commission',
+    'Reg Fees',
+    'Net Open Trade',
+    'Close Date',
+    'Close Price',
+    'Commission',
+    'Reg Fees',
+    'Net Close Trade',
+    'Net Profit / Loss',
+    'Total Commissions',
+    'Gross Profit / Loss'
+]
+
+
+FORMAT_COL_HEADINGS = [
+    'Close Date',
+    'Open Date',
+    'Quantity',
+    'Symbol',
+    'Description',
+    'Open Price',
+    'Commission',
+    'Reg Fees',
+    'Net Open Trade',
+    'Close Price',
+    'Commission',
+    'Reg Fees',
+    'Net Close Trade',
+    'Net Profit / Loss',
+    'Total Commissions',
+    'Gross Profit / Loss'
+]
+
+
+class TradeEvent:
+    """
+    We will consider a "trade event" to be a closing trade, with
+    corresponding opening trade data.  For trades with multiple
+    legs/parcels, the open trade data will have been adjusted appropriately.
+    """
+
+    def __init__(self, symbol, desc, qty):
+        self.symbol = symbol
+        self.description = desc
+        self.qty = qty
+        self.parcel = 1
+        self.parcel_count = 1
+
+    def open(self, d, p, b, f, net):
+        self.open_date = d
+        self.open_price = p
+        self.open_brokerage = b
+        self.open_fees = f
+        self.open_net = net
+        self.open_gross = self.qty * self.open_price * \
+            OptionActivity.OPTION_CONTRACT_SIZE
+
+    def close(self, d, p, b, f, net):
+        self.close_date = d
+        self.close_price = p
+        self.close_brokerage = b
+        self.close_fees = f
+        self.close_net = net
+        self.close_gross = self.qty * self.close_price * \
+            OptionActivity.OPTION_CONTRACT_SIZE
+
+        self.net_total = self.close_net - self.open_net
+        self.gross_total = self.close_gross - self.open_gross
+
+    def totals(self, n, g):
+        pass
+
+    def set_parcel(self, p, c):
+        self.parcel = p
+        self.parcel_count = c
+
+    def get_total_costs(self):
+        return (self.open_brokerage + self.close_brokerage + 
+                self.open_fees + self.close_fees)
+    
+
+    def get_raw_result(self):
+        result =  [
+            str(self.open_date),
+            self.qty,
+            self.symbol,
+            self.description,
+            self.open_price,
+            self.open_brokerage,
+            self.open_fees,
+            self.open_net,
+            str(self.close_date),
+            self.close_price,
+            self.close_brokerage,
+            self.close_fees,
+            self.close_net,
+            self.net_total,
+            self.get_total_costs(),
+            self.gross_total
+            ]
+        if self.parcel_count != 1:
+            result.append("Partially closed position %d of %d" % \
+                              (self.parcel, self.parcel_count))
+        return result
+
+
+    def get_format_result(self):
+        result =  [
+            self.close_date.strftime('%d/%m/%Y'),
+            self.open_date.strftime('%d/%m/%Y'),
+            self.qty,
+            self.symbol,
+            self.description,
+            self.open_price,
+            self.open_brokerage,
+            self.open_fees,
+            self.open_net,
+            self.close_price,
+            self.close_brokerage,
+            self.close_fees,
+            self.close_net,
+            self.net_total,
+            self.get_total_costs(),
+            self.gross_total
+            ]
+        if self.parcel_count != 1:
+            result.append("Partially closed position %d of %d" % \
+                              (self.parcel, self.parcel_count))
+        return result
+
+
+class TradeData:
+    """
+    The TradeData class is essentially a container for an Trade object with
+    it's assocaited (open and close) Activity objects.
+    """
+
+    def __init__(self, trade_id, symbol):
+        self.trade_id = trade_id
+        self.symbol = symbol
+        self.open_acts = []
+        self.close_acts = []
+        self.trade = None
+
+    def add_open_activity(self, a):
+        self.open_acts.append(a)
+
+    def add_close_activity(self, a):
+        self.close_acts.append(a)
+
+    def add_trade(self, t):
+        self.trade = t
+
+    def get_raw_events(self, event_list, start_date = None, end_date = None):
+        if self.trade.num_opens == 1 and self.trade.num_closes == 1:
+            o = self.open_acts[0]
+            c = self.close_acts[0]
+            
+            if (   (start_date is not None and c.ref_date.date() < start_date)
+                or (end_date is not None and c.ref_date.date() > end_date)):
+                return
+
+            te = TradeEvent(c.symbol, c.description, c.quantity)
+            te.open(o.ref_date,
+                    o.price,
+                    o.brokerage,
+                    o.fees,
+                    o.net_total_cost)
+            te.close(c.ref_date,
+                    c.price,
+                    c.brokerage,
+                    c.fees,
+                    c.net_total_cost)
+            te.totals(self.trade.net_total_cost,
+                      self.trade.gross_total_cost)
+            event_list.append(te)
+
+        elif self.trade.num_opens == 1 and self.trade.num_closes > 1:
+            o = self.open_acts[0]
+            o.closed_quantity = 0
+            parcel = 1
+            for c in self.close_acts:
+                te = TradeEvent(c.symbol, c.description, c.quantity)
+                o.closed_quantity += c.quantity
+                te.open(o.ref_date,
+                        o.price,
+                        o.brokerage / self.trade.num_closes,
+                        o.fees / self.trade.num_closes,
+                        o.net_total_cost / self.trade.num_closes)
+                te.close(c.ref_date,
+                         c.price,
+                         c.brokerage,
+                         c.fees,
+                         c.net_total_cost)
+                te.totals(self.trade.net_total_cost / self.trade.num_closes,
+                          self.trade.gross_total_cost / self.trade.num_closes)
+                te.set_parcel(parcel, self.trade.num_closes)
+                parcel += 1
+
+                # Only trades with a close in the date range get this far
+                # (see get_trades()), but not every parcel will be in range.
+                if (    (start_date is None or c.ref_date.date() >= start_date) 
+                        and 
+                        (end_date is None or c.ref_date.date() <= end_date)):
+                    event_list.append(te)
+            
+            if o.closed_quantity != o.quantity:
+                logging.error("*** QTY MISMATCH %s %s: %d of %d closed for multi-trade",
+                              self.trade.symbol, self.trade.description, 
+                              int(o.closed_quantity), int(o.quantity))
+        else:
+            logging.error("*** UNSUPPORTED: Multiple opens %s %s", 
+                          self.trade.symbol, self.trade.description)
+
+
+
+def get_closes_in_range(session, start_date, end_date):
+    """
+    Query for ids of trades with a closing activity in the date range
+    (i.e. trades that can have trade events in the range).
+    """
+    q = session.query(OptionActivity.trade_id).filter(
+            OptionActivity.action_id==ActionType.SELL_TO_CLOSE)
+    if start_date is not None:
+        q = q.filter(OptionActivity.ref_date>=dt.datetime.combine(start_date, dt.time()))
+    if end_date is not None:
+        q = q.filter(OptionActivity.ref_date<dt.datetime.combine(
+                end_date + dt.timedelta(days=1), dt.time()))
+    return q
+
+
+def get_trade_activities(session, trade_ids=None):
+    """
+    Get all activities that belong to a trade (or the trades in trade_ids
+    query), in one query.  Returns dict of trade id --> list of activities
+    (in date order).
+    """
+    q = session.query(OptionActivity).filter(OptionActivity.trade_id!=None)
+    if trade_ids is not None:
+        q = q.filter(OptionActivity.trade_id.in_(trade_ids))
+    activities = {}
+    for a in q.order_by(OptionActivity.ref_date, OptionActivity.id):
+        activities.setdefault(a.trade_id, []).append(a)
+    return activities
+
+
+@sqlstats.stage('get_trades')
+def get_trades(session, start_date=None, end_date=None):
+    """
+    List of TradeData for the closed trades, or (with start and/or end
+    dates) for the trades with a closing activity in the date range.
+    """
+    closed_trades = []
+    q = session.query(OptionTrade)
+    trade_ids = None
+    if start_date is not None or end_date is not None:
+        # Skip trades that can't have any trade events in the date range.
+        trade_ids = get_closes_in_range(session, start_date, end_date)
+        q = q.filter(OptionTrade.id.in_(trade_ids))
+    activities = get_trade_activities(session, trade_ids)
+
+    for t in q:
+        logging.debug("TRADE: %s %s", t.symbol, t.description)
+        if t.num_closes == 0:
+            if t.status_id == TradeStatus.OPEN:
+                logging.debug("*** Ignoring open trade %d", t.id)
+            else:
+                logging.error("*** Zero count closing activities for trade %d", t.id)
+            continue
+
+        td = TradeData(t.id, t.symbol)
+        td.add_trade(t)
+
+        for a in activities.get(t.id, ()):
+            if a.action_id == ActionType.BUY_TO_OPEN:
+                td.add_open_activity(a)
+            elif a.action_id == ActionType.SELL_TO_CLOSE:
+                td.add_close_activity(a)
+            else:
+                logging.warn("*** Unexpected action in acivity %d", a.id)
+
+        if len(td.open_acts) != t.num_opens or t.num_opens == 0:
+            logging.error("*** open activity mismatch for trade %d", t.id)
+        if len(td.close_acts) != t.num_closes or t.num_closes == 0:
+            logging.error("*** close activity mismatch for trade %d", t.id)
+        closed_trades.append(td)
+    return closed_trades
+
+
+def generate_events(closed_trades, start, end):
+    """
+    List of trade events in the date range, from closed_trades (which is
+    sorted by close date).
+    """
+    if start is None and end is None:
+        logging.info("Generating trade events for all date data.")
+    else:
+        if start is None:
+            logging.info("Generating trade events until %s", str(end))
+        elif end is None:
+            logging.info("Generating trade events from %s", str(start))
+        else:
+            logging.info("Generating trade events from %s to %s", 
+                         str(start), str(end))
+    trade_events = []
+    closed_trades.sort(cmp_trade_data_close_date)
+    for td in closed_trades:
+        td.get_raw_events(trade_events, start, end)
+    return trade_events
+
+
+def write_raw_events(trade_events, outfile):
+    writer = csv.writer(outfile)
+    writer.writerow(RAW_COL_HEADINGS)
+    for te in trade_events:
+        out = te.get_raw_result()
+        writer.writerow(out)
+
+
+def print_raw_summary(trade_events, out=sys.stdout):
+    total_net_profit = 0
+    total_gross_profit = 0
+    total_costs = 0
+    for te in trade_events:
+        total_net_profit += te.net_total
+        total_gross_profit += te.gross_total
+        total_costs += te.get_total_costs()
+
+    print('\n==================================================', file=out)
+    print('\nSummary "Raw"\n', file=out)
+    print('Total Gross Profit/Loss: %10.2f' % total_gross_profit, file=out)
+    print('Total brokerage/costs:   %10.2f' % total_costs, file=out)
+    print('Total Net Profit/Loss:   %10.2f' % total_net_profit, file=out)
+    print('\n==================================================', file=out)
+
+
+#
+#  "formatted" events have columns in slightly different order, and
+#  datetime fields are output as just the date in AU format (DMY).
+#
+def write_formatted_events(trade_events, outfile):
+    writer = csv.writer(outfile)
+    writer.writerow(FORMAT_COL_HEADINGS)
+    for te in trade_events:
+        out = te.get_format_result()
+        writer.writerow(out)
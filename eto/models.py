@@ -27,7 +27,6 @@
 from __future__ import division
 import sys
 import logging
-import datetime
 import decimal
 import sqlalchemy
 from sqlalchemy.ext.declarative import declarative_base
@@ -35,25 +34,20 @@ from sqlalchemy import Column, Integer, String
 from sqlalchemy import ForeignKey
 from sqlalchemy.orm import relationship, backref
 
-logger = logging.getLogger(__name__)
-
-
-class Config(object):
-    def __init__(self):
-        self.db_connect_str = 'sqlite:///theto.db'
-    
-    def is_sqlite(self):
-        return True   # for now
+from eto.config import g_config
+from eto.util import parse_ref_datetime
+from cfd.database import Database, create_indexes
+from cfd.currency import currency_type, migrate_currency
 
+logger = logging.getLogger(__name__)
 
-g_config = Config()
 
+_database = Database(g_config)
+get_engine = _database.get_engine
+enable_sql_stats = _database.enable_sql_stats
 
-engine = sqlalchemy.create_engine(
-                    g_config.db_connect_str,
-                    echo=False)
 Base = declarative_base()
-Session = sqlalchemy.orm.sessionmaker(bind=engine)
+Session = sqlalchemy.orm.sessionmaker()
 
 
 class ModelsError(Exception):
@@ -63,22 +57,7 @@ class ModelsError(Exception):
         self.msg = msg
 
 
-class DecimalString(sqlalchemy.types.TypeDecorator):
-    impl = sqlalchemy.types.String
-
-    def process_bind_param(self, value, dialect):
-        return str(value)
-
-    def process_result_value(self, value, dialect):
-        return decimal.Decimal(value)
-
-#
-# Grrrr.... 
-#
-if g_config.is_sqlite():
-    CurrencyType = DecimalString
-else:
-    CurrencyType = sqlalchemy.Numeric
+CurrencyType = currency_type(g_config)
 
 
 ###############################################################################
@@ -247,7 +226,7 @@ class OptionActivity(Base):
     OPTION_CONTRACT_SIZE = 100
 
     id 			= Column(Integer, primary_key=True)
-    trade_id 		= Column(Integer, ForeignKey('option_trade.id'))  
+    trade_id 		= Column(Integer, ForeignKey('option_trade.id'), index = True)
     ref_date 		= Column(sqlalchemy.DateTime, nullable = False)  
     symbol 		= Column(String(255), nullable = False)  
     description 	= Column(String(255), nullable = False)  
@@ -267,65 +246,86 @@ class OptionActivity(Base):
         return (   self.action_id == ActionType.SELL_TO_CLOSE
                 or self.action_id == ActionType.EXERCISE)
 
-    def __init__(self, row):
-        self.init_from_list(row)
+    # Columns populated from the input file, in the order returned by
+    # parse_list().
+    IMPORT_FIELDS = ('ref_date', 'symbol', 'description', 'broker_ref',
+                     'action_id', 'quantity', 'price', 'brokerage', 'fees',
+                     'net_total_cost', 'gross_total_cost')
+
+    def __init__(self, row=None):
+        if row is not None:
+            self.init_from_list(row)
+
+    def init_from_list(self, row):
+        self.init_from_values(self.parse_list(row))
+
+    def init_from_values(self, values):
+        """Set the imported columns from a parse_list() tuple."""
+        for name, value in zip(self.IMPORT_FIELDS, values):
+            setattr(self, name, value)
 
     # Order of fields in raw activity file is:
     # Symbol, Description, Action, Quantity, Price, Commission, Reg Fees, 
     # Date, TransactionID, Order Number, Transaction Type ID, Total Cost
-    def init_from_list(self, row):
-        self.ref_date = datetime.datetime.strptime(row[7], '%d/%m/%Y %I:%M:%S %p')
-        self.symbol = row[0]
-        self.description = row[1]
-        self.broker_ref = row[9]
-
-        found = False
+    @classmethod
+    def parse_list(cls, row):
+        """Parse and check a row from the input file, into a plain tuple of
+        values in IMPORT_FIELDS order.  Used directly by the parallel
+        importer."""
+        ref_date = parse_ref_datetime(row[7])
+
+        action_id = None
         for i in range(1, len(ActionType.NAMES)):
             if row[2].upper() == ActionType.NAMES[i]:
-                self.action_id = i
-                found = True
+                action_id = i
                 break
-        if not found:
+        if action_id is None:
             raise ModelsError('init_with_list', "Invalid Action Type")
-        if self.action_id == ActionType.BUY or self.action_id == ActionType.SELL:
+        if action_id == ActionType.BUY or action_id == ActionType.SELL:
             # This block is redundant -- looks like there will be a Sell To Close
             # in the raw data for option exercise.
             raise ModelsError('init_with_list', 
                                 "Ignoring Buy or Sell action!")
 
-#            if 'exercise' not in self.description.lower():
+#            if 'exercise' not in row[1].lower():
 #                raise ModelsError('init_with_list', 
 #                                   "Buy or Sell action that doesn't look like an option exercise")
-            self.action_id = ActionType.EXERCISE
-            self.quantity = decimal.Decimal(row[3]) / OptionActivity.OPTION_CONTRACT_SIZE
-            self.price = 0
-            self.brokerage = 0
-            self.fees = 0
-            self.net_total_cost = 0
+            action_id = ActionType.EXERCISE
+            quantity = decimal.Decimal(row[3]) / cls.OPTION_CONTRACT_SIZE
+            price = 0
+            brokerage = 0
+            fees = 0
+            net_total_cost = 0
             # TODO: An equivalent "BUY" (or "EXERCISE"?) activity for the equity will eventually
             # need to be created (in a future equity_trade table, most likely).
         else:
-            self.quantity = decimal.Decimal(row[3])
-            self.price = decimal.Decimal(row[4])
-            self.brokerage = decimal.Decimal(row[5])
-            self.fees = decimal.Decimal(row[6])
+            quantity = decimal.Decimal(row[3])
+            price = decimal.Decimal(row[4])
+            brokerage = decimal.Decimal(row[5])
+            fees = decimal.Decimal(row[6])
             net_str = row[11].replace('-', '')
-            self.net_total_cost = decimal.Decimal(net_str)
+            net_total_cost = decimal.Decimal(net_str)
         
-        self.update_gross()    
+        gross_total_cost = quantity * cls.OPTION_CONTRACT_SIZE * price
         
-        if (self.action_id == ActionType.BUY_TO_OPEN):
-            if self.net_total_cost != (self.gross_total_cost + self.brokerage + self.fees):
+        if (action_id == ActionType.BUY_TO_OPEN):
+            if net_total_cost != (gross_total_cost + brokerage + fees):
                 logger.error("*** ERROR: Net/Gross calculation error!")
                 raise ModelsError('init_with_list', "Net/Gross calculation error!")
-        elif (self.action_id == ActionType.SELL_TO_CLOSE):
-            if self.net_total_cost != (self.gross_total_cost - self.brokerage - self.fees):
+        elif (action_id == ActionType.SELL_TO_CLOSE):
+            if net_total_cost != (gross_total_cost - brokerage - fees):
                 logger.error("*** ERROR: Net/Gross calculation error!")
                 raise ModelsError('init_with_list', "Net/Gross calculation error!")
 
+        return (ref_date, row[0], row[1], row[9], action_id, quantity, price,
+                brokerage, fees, net_total_cost, gross_total_cost)
+
 
 class OptionTrade(Base):
     __tablename__ = 'option_trade'
+    # Open trades are looked up by symbol and status.
+    __table_args__ = (sqlalchemy.Index('ix_option_trade_symbol_status_id',
+                                       'symbol', 'status_id'),)
 
     id 			= Column(Integer, primary_key=True)
     symbol 		= Column(String(255), nullable = False)  
@@ -369,18 +369,32 @@ def db_populate_ref(session):
 
 
 def db_get_session():
-    return Session()
+    return Session(bind=get_engine())
 
 
 def db_create():
-    session = Session()
+    engine = get_engine()
+    session = Session(bind=engine)
     Base.metadata.drop_all(engine) 
     Base.metadata.create_all(engine) 
     db_populate_ref(session)
 
 
 def db_refresh_trades():
+    engine = get_engine()
     t = Base.metadata.tables['option_trade']
     t.drop(engine, True)
     t.create(engine)
 
+
+def db_migrate_currency(from_scale=None):
+    ''' Convert money/quantity columns of an existing database to the
+    currency storage type currently configured (see cfd.currency).'''
+    migrate_currency(get_engine(), Base.metadata, from_scale)
+
+
+def db_create_indexes():
+    """ Add any indexes missing from an existing database (e.g. one created
+    before the indexes were declared)."""
+    create_indexes(get_engine(), Base.metadata)
+
@@ -1,28 +1,87 @@
 #import sys
 import logging
+import datetime
 from eto import VERSION_STRING, APPLICATION_NAME
+from cfd.util import add_log_handlers
 
 
 logger = logging.getLogger()
 
 
-def init_logging(level=None, filename=None):
+def init_logging(level=None, filename=None, background=False):
+    """ Log to the console (and filename), see add_log_handlers()."""
     if not level:
         level = logging.INFO
     formatter = logging.Formatter('%(levelname)s:\t%(message)s\t[%(name)s]')
     console = logging.StreamHandler()
     console.setLevel(level)
     console.setFormatter(formatter)
-    logger.addHandler(console)
+    handlers = [console]
     if filename:
-        logfile = logging.FileHandler('gencfdprocess.log')
+        logfile = logging.FileHandler(filename)
         logfile.setLevel(logging.DEBUG)
         logfile.setFormatter(formatter)
-        logger.addHandler(logfile)
-    
-    if level:
-        logger.setLevel(level)
-        logger.info("Starting %s v%s: setting log level to %d", 
-                    APPLICATION_NAME, VERSION_STRING, level)
-    else:
-        logger.info("Starting " + APPLICATION_NAME + " " + VERSION_STRING)
+        handlers.append(logfile)
+    add_log_handlers(handlers, background)
+
+    logger.setLevel(level)
+    logger.info("Starting %s v%s: setting log level to %d", 
+                APPLICATION_NAME, VERSION_STRING, level)
+
+
+# Activity files repeat the same few hundred dates, so the date part of
+# parsed date-times is memoised.  The cache is simply emptied when it gets
+# to DATE_CACHE_SIZE.
+DATE_CACHE_SIZE = 4096
+_ref_date_cache = {}
+
+
+def _parse_time(timestring, ampm):
+    """ (hour, minute, second) from hh:mm:ss and AM/PM, or None."""
+    parts = timestring.split(':')
+    if len(parts) != 3:
+        return None
+    h, m, s = parts
+    if not (0 < len(h) <= 2 and 0 < len(m) <= 2 and 0 < len(s) <= 2 and
+            h.isdigit() and m.isdigit() and s.isdigit()):
+        return None
+    hour = int(h)
+    if not 1 <= hour <= 12:
+        return None
+    if hour == 12:
+        hour = 0
+    if ampm == 'PM' or ampm == 'pm':
+        hour += 12
+    elif ampm != 'AM' and ampm != 'am':
+        return None
+    return hour, int(m), int(s)
+
+
+def parse_ref_datetime(datestring):
+    """ Parse DD/MM/YYYY hh:mm:ss AM/PM, same as
+    strptime(datestring, '%d/%m/%Y %I:%M:%S %p')."""
+    parts = datestring.split(' ')
+    if len(parts) == 3:
+        hms = _parse_time(parts[1], parts[2])
+        if hms is not None:
+            try:
+                d = _ref_date_cache[parts[0]]
+            except KeyError:
+                d = _parse_date(parts[0])
+            if d is not None:
+                return datetime.datetime(d.year, d.month, d.day, *hms)
+    return datetime.datetime.strptime(datestring, '%d/%m/%Y %I:%M:%S %p')
+
+
+def _parse_date(datestring):
+    """ Parse (and cache) DD/MM/YYYY date, or None."""
+    parts = datestring.split('/')
+    if (len(parts) != 3 or len(parts[2]) != 4 or
+            not all(p.isdigit() and 0 < len(p) <= 4 for p in parts) or
+            len(parts[0]) > 2 or len(parts[1]) > 2):
+        return None
+    value = datetime.date(int(parts[2]), int(parts[1]), int(parts[0]))
+    if len(_ref_date_cache) >= DATE_CACHE_SIZE:
+        _ref_date_cache.clear()
+    _ref_date_cache[datestring] = value
+    return value
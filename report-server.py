@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+#  report-server.py
+#
+#  Serves the cfd-report.py, cfd-csv-export.py and eto-csv-export.py
+#  reports over HTTP on localhost, from data held in memory (see cfd/cache.py
+#  and eto/cache.py), e.g.
+#
+#    curl 'http://localhost:8765/cfd/report?fyau=2014'
+#    curl 'http://localhost:8765/cfd/trade.csv?start=2013-07-01&end=2014-06-30'
+#    curl 'http://localhost:8765/eto/format_events.csv?fyau=2014'
+#
+#  Each database is loaded on the first request for it, and loaded again
+#  after anything else commits to it (an import, processing run, etc).
+#
+
+from __future__ import division, print_function
+import sys
+import csv
+import json
+import logging
+import argparse
+import urlparse
+import StringIO
+import datetime as dt
+import BaseHTTPServer
+
+sys.path.insert(0, '.')
+
+from cfd.util import mkdate, log_level, LOG_LEVELS
+import cfd.config
+import eto.config
+from eto.util import init_logging
+
+logger = logging.getLogger(__file__)
+
+DEFAULT_PORT = 8765
+
+# Responses kept per database, for repeated requests.  They're all dropped
+# when there are RESPONSE_CACHE_SIZE, or the database changes.
+RESPONSE_CACHE_SIZE = 64
+
+
+class RequestError(Exception):
+    def __init__(self, status, msg):
+        self.status = status
+        self.msg = msg
+
+
+class Reports(object):
+    """
+    The cache for one database (cfd or eto), and responses made from it.
+    Loaded on first use, and dropped when another process commits to the
+    database.
+    """
+
+    def __init__(self, name, cache_module):
+        self.name = name
+        self.cache_module = cache_module
+        self.version = None
+        self.cache = None
+        # (path, start, end) --> response body
+        self.responses = {}
+        self.loads = 0
+        self.hits = 0
+        self.invalidations = 0
+
+    def get(self):
+        if self.version is None:
+            self.version = self.cache_module.data_version()
+        if self.cache is not None and self.version.changed():
+            logger.info("%s database changed", self.name)
+            self.invalidate()
+        if self.cache is None:
+            self.cache = self.cache_module.load()
+            self.loads += 1
+        else:
+            self.hits += 1
+        return self.cache
+
+    def response(self, path, report, start, end):
+        cache = self.get()
+        key = (path, start, end)
+        body = self.responses.get(key)
+        if body is None:
+            if len(self.responses) >= RESPONSE_CACHE_SIZE:
+                self.responses.clear()
+            body = self.responses[key] = report(cache, start, end)
+        return body
+
+    def invalidate(self):
+        if self.cache is not None:
+            self.cache = None
+            self.responses.clear()
+            self.invalidations += 1
+
+    def status(self):
+        return {'loaded': self.cache is not None,
+                'load_seconds': self.cache.seconds if self.cache else None,
+                'responses': len(self.responses),
+                'loads': self.loads,
+                'hits': self.hits,
+                'invalidations': self.invalidations}
+
+
+def date_range(query):
+    """ (start, end) dates from start/end or fyau query parameters."""
+    def param(name):
+        values = query.get(name)
+        return values[-1] if values else None
+
+    start = None
+    end = None
+    if param('fyau'):
+        if param('start') or param('end'):
+            raise RequestError(400, "Can't specify fyau with start and/or end dates.")
+        year = param('fyau')
+        if not year.isdigit() or int(year) < 1900 or int(year) > 9999:
+            raise RequestError(400, "Invalid year")
+        start = dt.date(int(year) - 1, 7, 1)
+        end = dt.date(int(year), 6, 30)
+    else:
+        try:
+            if param('start'):
+                start = mkdate(param('start'))
+            if param('end'):
+                end = mkdate(param('end'))
+        except ValueError as e:
+            raise RequestError(400, "Invalid date: " + str(e))
+    return start, end
+
+
+def csv_text(header, rows):
+    out = StringIO.StringIO()
+    writer = csv.writer(out)
+    if header is not None:
+        writer.writerow(header)
+    writer.writerows(rows)
+    return out.getvalue()
+
+
+def cfd_report(cache, start, end):
+    out = StringIO.StringIO()
+    print_legacy_summary(cache.report_summary(start, end), out)
+    return out.getvalue()
+
+
+def cfd_summary(cache, start, end):
+    out = StringIO.StringIO()
+    print_export_summary(cache.summary(start, end), start, end, out)
+    return out.getvalue()
+
+
+def cfd_cash_csv(name):
+    def report(cache, start, end):
+        return csv_text(None, cache.cash_rows(name, start, end))
+    return report
+
+
+def cfd_trade_csv(cache, start, end):
+    return csv_text(TRADE_COLUMNS, cache.trade_rows(start, end))
+
+
+def eto_summary(cache, start, end):
+    out = StringIO.StringIO()
+    print_raw_summary(cache.trade_events(start, end), out)
+    return out.getvalue()
+
+
+def eto_raw_csv(cache, start, end):
+    out = StringIO.StringIO()
+    write_raw_events(cache.trade_events(start, end), out)
+    return out.getvalue()
+
+
+def eto_format_csv(cache, start, end):
+    out = StringIO.StringIO()
+    write_formatted_events(cache.trade_events(start, end), out)
+    return out.getvalue()
+
+
+class ReportHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # path --> (database, report function)
+    routes = {}
+    # database --> Reports
+    reports = {}
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        try:
+            if url.path == '/status':
+                body = json.dumps(dict((name, r.status())
+                                       for name, r in self.reports.items()),
+                                  indent=1, sort_keys=True) + '\n'
+            else:
+                if url.path not in self.routes:
+                    raise RequestError(404, "No such report: " + url.path)
+                name, report = self.routes[url.path]
+                start, end = date_range(urlparse.parse_qs(url.query))
+                body = self.reports[name].response(url.path, report,
+                                                   start, end)
+        except RequestError as e:
+            self.send_text(e.status, e.msg + '\n')
+            return
+        except Exception:
+            logger.exception("Error generating %s", self.path)
+            self.send_text(500, "Error generating report (see server log)\n")
+            return
+        self.send_text(200, body, 'text/csv' if url.path.endswith('.csv')
+                       else 'text/plain')
+
+    def do_POST(self):
+        if urlparse.urlparse(self.path).path != '/invalidate':
+            self.send_text(404, "Not found\n")
+            return
+        for r in self.reports.values():
+            r.invalidate()
+        self.send_text(200, "OK\n")
+
+    def send_text(self, status, body, content_type='text/plain'):
+        if isinstance(body, unicode):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type + '; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.info("%s %s", self.client_address[0], format % args)
+
+
+if __name__ ==  "__main__":
+    parser = argparse.ArgumentParser(description='report-server: Serve reports '
+                                     'from memory over HTTP on localhost')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help='port (default %(default)d)')
+    parser.add_argument('--cfd-db', metavar='URL',
+                        default=cfd.config.g_config.db_connect_str,
+                        help='CFD database (default %(default)s)')
+    parser.add_argument('--eto-db', metavar='URL',
+                        default=eto.config.g_config.db_connect_str,
+                        help='options database (default %(default)s)')
+    parser.add_argument('--preload', action='store_true',
+                        help='load both databases at startup, instead of '
+                        'on the first request for each')
+    parser.add_argument('--log-level', choices=LOG_LEVELS, default='info',
+                        help='log level (default %(default)s)')
+    parser.add_argument('--log-file', help='also log to this file')
+    parser.add_argument('--background-log', action='store_true',
+                        help='write log messages from a background thread, '
+                        'instead of as they are logged')
+    args = parser.parse_args()
+    cfd.config.g_config.db_connect_str = args.cfd_db
+    eto.config.g_config.db_connect_str = args.eto_db
+    # Load the models (and SQLAlchemy) only once the arguments are OK.
+    import cfd.cache
+    import eto.cache
+    from cfd.summary import print_legacy_summary
+    from cfd.export import CASH_FILES, TRADE_COLUMNS, print_export_summary
+    from eto.export import (write_raw_events, print_raw_summary,
+                            write_formatted_events)
+
+    init_logging(log_level(args.log_level), args.log_file, args.background_log)
+
+    ReportHandler.reports = {'cfd': Reports('cfd', cfd.cache),
+                             'eto': Reports('eto', eto.cache)}
+    routes = {'/cfd/report': ('cfd', cfd_report),
+              '/cfd/summary': ('cfd', cfd_summary),
+              '/cfd/trade.csv': ('cfd', cfd_trade_csv),
+              '/eto/summary': ('eto', eto_summary),
+              '/eto/raw_events.csv': ('eto', eto_raw_csv),
+              '/eto/format_events.csv': ('eto', eto_format_csv)}
+    for name in CASH_FILES:
+        routes['/cfd/%s.csv' % name] = ('cfd', cfd_cash_csv(name))
+    ReportHandler.routes = routes
+
+    if args.preload:
+        for r in ReportHandler.reports.values():
+            r.get()
+
+    server = BaseHTTPServer.HTTPServer(('127.0.0.1', args.port), ReportHandler)
+    logger.info("Serving reports on http://127.0.0.1:%d/", args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
@@ -0,0 +1,125 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# test_cs2ss.py: cs2ss.py money parsing and formatting, and --stream, e.g.
+#
+#   python -m unittest discover tests
+#
+
+from __future__ import division, unicode_literals, print_function
+import os
+import sys
+import imp
+import shutil
+import decimal
+import random
+import tempfile
+import unittest
+import subprocess
+
+sys.path.insert(0, '.')
+from bench.generators import commsec_rows, write_csv
+
+cs2ss = imp.load_source('cs2ss', 'cs2ss.py')
+
+D = decimal.Decimal
+
+
+class MoneyTest(unittest.TestCase):
+
+    def test_parse_money(self):
+        for s, units in [('1', 1000000), ('1.5', 1500000), (' 12.345 ', 12345000),
+                         ('-0.01', -10000), ('.5', 500000), ('-.5', -500000),
+                         ('0.000001', 1), ('1e2', 100000000)]:
+            self.assertEqual(cs2ss.parse_money(s), units)
+
+    def test_parse_money_rounding(self):
+        # More than MONEY_SCALE decimal places are rounded half even.
+        self.assertEqual(cs2ss.parse_money('1.2345675'), 1234568)
+        self.assertEqual(cs2ss.parse_money('1.2345665'), 1234566)
+        self.assertEqual(cs2ss.parse_money('-1.0000005'), -1000000)
+        self.assertEqual(cs2ss.parse_money('-1.00000051'), -1000001)
+
+    def test_parse_money_invalid(self):
+        self.assertRaises(decimal.InvalidOperation, cs2ss.parse_money, 'abc')
+
+    def test_money_str(self):
+        for units, s in [(0, '0.00'), (1500000, '1.50'), (1234567, '1.234567'),
+                         (-1, '-0.000001'), (-500000, '-0.50'),
+                         (37860000000, '37860.00'), (10, '0.00001')]:
+            self.assertEqual(cs2ss.money_str(units), s)
+
+    def test_money_str_same_as_decimal(self):
+        rand = random.Random(1)
+        for i in range(10000):
+            units = rand.randint(-10 ** 12, 10 ** 12)
+            value = D(units).scaleb(-cs2ss.MONEY_SCALE)
+            self.assertEqual(D(cs2ss.money_str(units)), value)
+            self.assertTrue(len(cs2ss.money_str(units).split('.')[1]) >= 2)
+
+    def test_money_cents(self):
+        # Halves are rounded away from zero, and there's no -0.00.
+        for units, s in [(51965000, '51.97'), (27345000, '27.35'),
+                         (-27345000, '-27.35'), (12344999, '12.34'),
+                         (-5000, '-0.01'), (4999, '0.00'), (-4999, '0.00'),
+                         (123456789000000, '123456789.00')]:
+            self.assertEqual(cs2ss.money_cents(units), s)
+
+    def test_trade_price_as_float(self):
+        # The log line shows prices as %6.2f of the float did.
+        for s in ['51.965', '27.345', '1.005', '0.5', '100']:
+            t = cs2ss.RawTrade()
+            t.type, t.qty, t.symbol, t.date = 'Buy', 100, 'ABC', '2008-07-01'
+            t.price = cs2ss.parse_money(s)
+            self.assertIn('@ %6.2f on' % float(s), str(t))
+
+
+class StreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='th-test-')
+        write_csv(os.path.join(self.work_dir, 'csin.csv'),
+                  commsec_rows(3000, partial_ratio=0.2))
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def run_cs2ss(self, *args):
+        ''' (closed trade rows, summary lines) from a cs2ss.py run.'''
+        script = os.path.abspath('cs2ss.py')
+        with open(os.devnull, 'w') as devnull:
+            out = subprocess.check_output([sys.executable, script] + list(args),
+                                          cwd=self.work_dir, stderr=devnull)
+        with open(os.path.join(self.work_dir, 'csout.csv'), 'rb') as f:
+            rows = f.read().splitlines()
+        totals = [line for line in out.splitlines() if line.startswith('Total')]
+        return rows, totals
+
+    def test_same_as_in_memory(self):
+        # Only the order of closed trades differs.
+        rows, totals = self.run_cs2ss()
+        stream_rows, stream_totals = self.run_cs2ss('--stream')
+        self.assertTrue(rows)
+        self.assertEqual(sorted(stream_rows), sorted(rows))
+        self.assertEqual(stream_totals, totals)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# test_currency.py: Currency column types and migrate_currency, e.g.
+#
+#   python -m unittest discover tests
+#
+
+from __future__ import division, unicode_literals, print_function
+import sys
+import decimal
+import unittest
+import sqlalchemy
+
+sys.path.insert(0, '.')
+from cfd.currency import DecimalString, ScaledInteger, migrate_currency
+
+D = decimal.Decimal
+
+VALUES = ['0', '1', '-1', '12.5', '-0.01', '1234.567891', '0.000001',
+          '-37860.25', '99999999.99']
+
+
+def trades_table(metadata, amount_type):
+    return sqlalchemy.Table('trades', metadata,
+        sqlalchemy.Column('id', sqlalchemy.Integer, primary_key=True),
+        sqlalchemy.Column('ref', sqlalchemy.String),
+        sqlalchemy.Column('amount', amount_type, index=True))
+
+
+class ScaledIntegerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.type = ScaledInteger(6)
+        self.dialect = sqlalchemy.create_engine('sqlite://').dialect
+
+    def bind(self, value):
+        return self.type.process_bind_param(value, self.dialect)
+
+    def result(self, value):
+        return self.type.process_result_value(value, self.dialect)
+
+    def test_bind(self):
+        for value, units in [(D('1'), 1000000), (D('-12.5'), -12500000),
+                             ('0.000001', 1), (D('0'), 0), (3, 3000000)]:
+            self.assertEqual(self.bind(value), units)
+        self.assertEqual(self.bind(None), None)
+
+    def test_bind_rounding(self):
+        # More than scale decimal places are rounded half even.
+        self.assertEqual(self.bind(D('0.0000005')), 0)
+        self.assertEqual(self.bind(D('0.0000015')), 2)
+        self.assertEqual(self.bind(D('-0.0000025')), -2)
+        self.assertEqual(self.bind(D('1.00000051')), 1000001)
+
+    def test_result(self):
+        # At least 2 decimal places, any more are kept.
+        for units, value in [(1000000, '1.00'), (-12500000, '-12.50'),
+                             (0, '0.00'), (1, '0.000001'),
+                             (1234567891, '1234.567891'), (10, '0.00001')]:
+            self.assertEqual(str(self.result(units)), value)
+        self.assertEqual(self.result(None), None)
+
+    def test_round_trip(self):
+        engine = sqlalchemy.create_engine('sqlite://')
+        metadata = sqlalchemy.MetaData()
+        table = trades_table(metadata, ScaledInteger(6))
+        metadata.create_all(engine)
+        engine.execute(table.insert(),
+                       [{'ref': v, 'amount': D(v)} for v in VALUES] +
+                       [{'ref': 'none', 'amount': None}])
+        for ref, amount in engine.execute(sqlalchemy.select([table.c.ref,
+                                                             table.c.amount])):
+            if ref == 'none':
+                self.assertEqual(amount, None)
+            else:
+                self.assertEqual(amount, D(ref))
+        # Stored as integers, so they sort numerically.
+        raw = [r[0] for r in engine.execute(
+                    'SELECT amount FROM trades WHERE amount IS NOT NULL '
+                    'ORDER BY amount')]
+        self.assertEqual(raw, sorted(int(D(v).scaleb(6)) for v in VALUES))
+        total = engine.execute(sqlalchemy.select(
+                    [sqlalchemy.func.sum(table.c.amount)])).scalar()
+        self.assertEqual(total, sum(D(v) for v in VALUES))
+
+
+class MigrateCurrencyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = sqlalchemy.create_engine('sqlite://')
+        metadata = sqlalchemy.MetaData()
+        table = trades_table(metadata, DecimalString())
+        metadata.create_all(self.engine)
+        self.engine.execute(table.insert(),
+                            [{'ref': v, 'amount': D(v)} for v in VALUES])
+
+    def raw_amounts(self):
+        return dict(tuple(row) for row in
+                    self.engine.execute('SELECT ref, amount FROM trades'))
+
+    def indexes(self):
+        inspector = sqlalchemy.inspect(self.engine)
+        return [ix['name'] for ix in inspector.get_indexes('trades')]
+
+    def migrate(self, amount_type, from_scale=None):
+        metadata = sqlalchemy.MetaData()
+        table = trades_table(metadata, amount_type)
+        migrate_currency(self.engine, metadata, from_scale)
+        return table
+
+    def test_to_scaled_and_back(self):
+        table = self.migrate(ScaledInteger(6))
+        self.assertEqual(self.raw_amounts(),
+                         dict((v, int(D(v).scaleb(6))) for v in VALUES))
+        self.assertEqual(self.indexes(), ['ix_trades_amount'])
+        for ref, amount in self.engine.execute(
+                sqlalchemy.select([table.c.ref, table.c.amount])):
+            self.assertEqual(amount, D(ref))
+
+        self.migrate(DecimalString(), from_scale=6)
+        for ref, amount in self.raw_amounts().items():
+            self.assertEqual(D(amount), D(ref))
+        self.assertEqual(self.indexes(), ['ix_trades_amount'])
+
+    def test_rescale(self):
+        self.migrate(ScaledInteger(6))
+        self.migrate(ScaledInteger(2), from_scale=6)
+        raw = self.raw_amounts()
+        self.assertEqual(raw['1234.567891'], 123457)
+        self.assertEqual(raw['0.000001'], 0)
+        self.assertEqual(raw['-37860.25'], -3786025)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# test_dates.py: parse_ref_date() against strptime, e.g.
+#
+#   python -m unittest discover tests
+#
+
+from __future__ import division, unicode_literals, print_function
+import sys
+import unittest
+import datetime as dt
+
+sys.path.insert(0, '.')
+from cfd.util import parse_ref_date
+
+
+class ParseRefDateTest(unittest.TestCase):
+
+    def test_same_as_strptime(self):
+        for s in ['01/02/13', '1/2/13', '31/12/68', '01/01/69', '29/02/12']:
+            self.assertEqual(parse_ref_date(s),
+                             dt.datetime.strptime(s, '%d/%m/%y').date())
+
+    def test_extra_parts(self):
+        self.assertRaises(ValueError, parse_ref_date, '01/02/13/99')
+
+    def test_missing_parts(self):
+        self.assertRaises(ValueError, parse_ref_date, '01/02')
+        self.assertRaises(ValueError, parse_ref_date, '')
+
+    def test_invalid(self):
+        for s in ['32/01/13', '29/02/13', '01/02/2013', 'a/b/c']:
+            self.assertRaises(ValueError, parse_ref_date, s)
+
+
+if __name__ == "__main__":
+    unittest.main()
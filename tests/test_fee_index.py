@@ -0,0 +1,134 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# test_fee_index.py: cfd-process.py's FeeIndex against the LIKE queries it
+# replaced, e.g.
+#
+#   python -m unittest discover tests
+#
+
+from __future__ import division, unicode_literals, print_function
+import sys
+import imp
+import random
+import datetime
+import unittest
+import sqlalchemy
+
+sys.path.insert(0, '.')
+from cfd.models import Base, Session, RawData
+
+cfd_process = imp.load_source('cfd_process', 'cfd-process.py')
+# Normally imported by the script's __main__ block.
+cfd_process.RawData = RawData
+FeeIndex = cfd_process.FeeIndex
+
+# Some refs are prefixes of others, as LIKE '%DIA12%' also matches DIA123.
+REFS = ['DIA12', 'DIA123', 'dia77', 'ZX9', 'Q1', 'DIA1234X']
+
+START = datetime.date(2013, 1, 1)
+
+
+def random_description(rand):
+    words = ['COMM', 'CRPREM', 'fee', 'BHP', 'x', '']
+    words += [rand.choice(REFS) for i in range(2)]
+    words += [rand.choice(REFS).lower(), 'DIA1', 'DIA', 'ZX', 'Q']
+    rand.shuffle(words)
+    return ' '.join(words[:rand.randint(1, 4)])
+
+
+class FindRefsTest(unittest.TestCase):
+
+    def test_same_as_substring(self):
+        rand = random.Random(1)
+        refs = set(r.upper() for r in REFS)
+        lengths = sorted(set(len(r) for r in refs))
+        for i in range(2000):
+            description = random_description(rand)
+            expected = set(r for r in refs if r in description.upper())
+            self.assertEqual(FeeIndex.find_refs(description, refs, lengths),
+                             expected, description)
+
+    def test_no_refs(self):
+        self.assertEqual(FeeIndex.find_refs('DIA12 COMM', set(), []), set())
+
+
+class FeeIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        engine = sqlalchemy.create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = Session(bind=engine)
+        rand = random.Random(2)
+        for i in range(400):
+            category = rand.choice([RawData.CAT_COMM, RawData.CAT_RISK,
+                                    RawData.CAT_XFEE])
+            raw = RawData()
+            raw.init_from_values((
+                rand.randint(1, 50), 'WITH',
+                START + datetime.timedelta(rand.randint(0, 60)), 'R%d' % i,
+                random_description(rand), '-', 0, 'A$', 0, 0,
+                -rand.randint(1, 100), '', category))
+            self.session.add(raw)
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def like(self, category, ref_date, broker_ref, order):
+        q = self.session.query(RawData).filter(
+                    RawData.category==category,
+                    RawData.ref_date<=ref_date,
+                    RawData.description.like('%' + broker_ref + '%'))
+        return q.order_by(*order).all()
+
+    def test_same_as_like(self):
+        index = FeeIndex(self.session, REFS)
+        for broker_ref in REFS:
+            for days in (-1, 0, 10, 30, 59, 61):
+                ref_date = START + datetime.timedelta(days)
+                self.assertEqual(
+                    index.get_comm(ref_date, broker_ref),
+                    self.like(RawData.CAT_COMM, ref_date, broker_ref,
+                              (RawData.import_id, RawData.ref_date, RawData.id)))
+                self.assertEqual(
+                    index.get_other_fees(ref_date, broker_ref),
+                    self.like(RawData.CAT_RISK, ref_date, broker_ref,
+                              (RawData.id,)))
+
+    def test_unknown_ref(self):
+        index = FeeIndex(self.session, ['DIA12'])
+        self.assertTrue(index.get_comm(START + datetime.timedelta(60), 'DIA12'))
+        self.assertEqual(index.get_comm(START + datetime.timedelta(60), 'ZX9'),
+                         [])
+
+    def test_lookup_dates(self):
+        table = {'DIA12': [(START, 'a'), (START + datetime.timedelta(5), 'b'),
+                           (START + datetime.timedelta(2), 'c')]}
+        self.assertEqual(FeeIndex.lookup(table, START, 'dia12'), ['a'])
+        self.assertEqual(FeeIndex.lookup(table, START + datetime.timedelta(2),
+                                         'DIA12'), ['a', 'c'])
+        self.assertEqual(FeeIndex.lookup(table, START - datetime.timedelta(1),
+                                         'DIA12'), [])
+        self.assertEqual(FeeIndex.lookup(table, START, 'Q1'), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# test_incremental.py: Adding a file with --incremental gives the same
+# results as a full rebuild, e.g.
+#
+#   python -m unittest discover tests
+#
+
+from __future__ import division, unicode_literals, print_function
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+sys.path.insert(0, '.')
+from bench.generators import ig_rows, write_csv
+
+EXPORT_FILES = ['div.csv', 'longint.csv', 'shortint.csv', 'unknown.csv',
+                'trade.csv']
+
+
+class IncrementalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='th-test-')
+        rows = list(ig_rows(1500))
+        # Positions opened in the first file are closed in the second, and
+        # the second file repeats the end of the first.
+        self.first = self.path('first.csv')
+        self.second = self.path('second.csv')
+        self.new = self.path('new.csv')
+        write_csv(self.first, rows[:1000])
+        write_csv(self.second, rows[950:])
+        write_csv(self.new, rows[1000:])
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def path(self, name):
+        return os.path.join(self.work_dir, name)
+
+    def run_script(self, db, *args):
+        env = dict(os.environ, TH_CFD_DB='sqlite:///' + self.path(db))
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output([sys.executable] + list(args),
+                                           env=env, stderr=devnull)
+
+    def build(self, db, files):
+        self.run_script(db, 'cfd-create-db.py')
+        self.run_script(db, 'cfd-import.py', *files)
+        self.run_script(db, 'cfd-categorise.py')
+        self.run_script(db, 'cfd-process.py', '--log-file', '')
+
+    def results(self, db):
+        ''' (report output, {export file: contents}) for a database.'''
+        report = self.run_script(db, 'cfd-report.py')
+        out_dir = self.path(db + '-export')
+        self.run_script(db, 'cfd-csv-export.py', out_dir)
+        exports = {}
+        for name in EXPORT_FILES:
+            with open(os.path.join(out_dir, name), 'rb') as f:
+                exports[name] = f.read()
+        return report, exports
+
+    def test_same_as_full_rebuild(self):
+        self.build('full.db', [self.first, self.new])
+
+        self.build('inc.db', [self.first])
+        out = self.run_script('inc.db', 'cfd-import.py', '--incremental',
+                              self.second)
+        self.assertIn('Skipped 50 entries already imported.', out)
+        self.run_script('inc.db', 'cfd-categorise.py', '--incremental')
+        self.run_script('inc.db', 'cfd-process.py', '--incremental',
+                        '--log-file', '')
+
+        report, exports = self.results('full.db')
+        inc_report, inc_exports = self.results('inc.db')
+        self.assertTrue(exports['trade.csv'])
+        self.assertEqual(inc_report, report)
+        for name in EXPORT_FILES:
+            self.assertEqual(inc_exports[name], exports[name], name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+# test_rules.py: CategoryRules against trying each rule in turn, e.g.
+#
+#   python -m unittest discover tests
+#
+
+from __future__ import division, unicode_literals, print_function
+import re
+import sys
+import json
+import unittest
+
+sys.path.insert(0, '.')
+from cfd.models import RawData
+from cfd.rules import CategoryRules, RulesError, load_rules
+
+RULES_FILE = 'cfd/category_rules.json'
+
+TYPES = ['DEAL', 'DEPO', 'WITH', 'EXCHANGE', 'DIVIDEND', 'OTHER']
+
+DESCRIPTIONS = ['Australia 200 Cash', 'australia200 x', 'BHP Billiton',
+                'BPAY payment', 'EFT Payment Sent 123', 'ASX fee on DIA1',
+                'Transfer from A to B at 1.0', 'Transfer to B',
+                'Woolworths LONG INT DIA2', 'SHORT INT DIA3',
+                'BHP COMM DIA4', 'BHP CRPREM DIA5', 'DVDX Woolworths',
+                'x DVDX', 'dvdq lower', '', 'Long Interest']
+
+
+def first_match(rules, raw_type, description):
+    ''' Category of the first rule matching, one rule at a time, as
+    categorisation used to be done.'''
+    for rule in rules:
+        if rule.get('type') not in (None, raw_type):
+            continue
+        if 'contains' in rule:
+            ok = rule['contains'].lower() in description.lower()
+        elif 'match' in rule:
+            ok = re.match(rule['match'], description, re.IGNORECASE)
+        elif 'search' in rule:
+            ok = re.search(rule['search'], description, re.IGNORECASE)
+        else:
+            ok = True
+        if ok:
+            return getattr(RawData, 'CAT_' + rule['category'].upper())
+    return RawData.CAT_UNKNOWN
+
+
+class CategoryRulesTest(unittest.TestCase):
+
+    def check(self, rules):
+        compiled = CategoryRules(rules)
+        types = []
+        descriptions = []
+        for raw_type in TYPES:
+            for description in DESCRIPTIONS:
+                self.assertEqual(compiled.categorise(raw_type, description),
+                                 first_match(rules, raw_type, description),
+                                 (raw_type, description))
+                types.append(raw_type)
+                descriptions.append(description)
+        self.assertEqual(compiled.categorise_columns(types, descriptions),
+                         [compiled.categorise(t, d)
+                          for t, d in zip(types, descriptions)])
+
+    def test_rules_file(self):
+        with open(RULES_FILE) as f:
+            self.check(json.load(f))
+        rules = load_rules(RULES_FILE)
+        self.assertEqual(rules.categorise('DEAL', 'Australia 200 Cash'),
+                         RawData.CAT_INDEX)
+        self.assertEqual(rules.categorise('DEAL', 'BHP Billiton'),
+                         RawData.CAT_TRADE)
+        self.assertEqual(rules.categorise('OTHER', 'DVDX Woolworths'),
+                         RawData.CAT_DIVIDEND)
+        self.assertEqual(rules.categorise('OTHER', 'BHP COMM DIA4'),
+                         RawData.CAT_UNKNOWN)
+
+    def test_untyped_rule_first(self):
+        # An earlier rule for any type beats a later one for the row's type.
+        self.check([{'category': 'XFEE', 'contains': 'fee'},
+                    {'category': 'COMM', 'type': 'WITH', 'contains': 'COMM'},
+                    {'category': 'RISK', 'type': 'WITH'}])
+        rules = CategoryRules([{'category': 'XFEE', 'contains': 'fee'},
+                               {'category': 'COMM', 'type': 'WITH'}])
+        self.assertEqual(rules.categorise('WITH', 'ASX fee'), RawData.CAT_XFEE)
+        self.assertEqual(rules.categorise('WITH', 'other'), RawData.CAT_COMM)
+
+    def test_typed_rule_first(self):
+        self.check([{'category': 'COMM', 'type': 'WITH', 'contains': 'fee'},
+                    {'category': 'XFEE', 'contains': 'fee'},
+                    {'category': 'TRADE', 'type': 'DEAL'}])
+
+    def test_no_rules_for_type(self):
+        # Types with no rules of their own only get the untyped rules.
+        rules = CategoryRules([{'category': 'TRADE', 'type': 'DEAL'},
+                               {'category': 'XFEE', 'contains': 'fee'}])
+        self.assertEqual(rules.categorise('OTHER', 'x'), RawData.CAT_UNKNOWN)
+        self.assertEqual(rules.categorise('OTHER', 'a fee'), RawData.CAT_XFEE)
+        rules = CategoryRules([{'category': 'TRADE', 'type': 'DEAL'}])
+        self.assertEqual(rules.categorise('OTHER', 'x'), RawData.CAT_UNKNOWN)
+        self.assertEqual(rules.categorise_columns(['OTHER', 'DEAL'], ['x', 'y']),
+                         [RawData.CAT_UNKNOWN, RawData.CAT_TRADE])
+
+    def test_contains_is_literal(self):
+        self.check([{'category': 'XFEE', 'contains': '1.0'},
+                    {'category': 'COMM', 'contains': '(A'}])
+        rules = CategoryRules([{'category': 'XFEE', 'contains': '1.0'}])
+        self.assertEqual(rules.categorise('DEAL', 'at 1x0'), RawData.CAT_UNKNOWN)
+
+    def test_invalid_rules(self):
+        self.assertRaises(RulesError, CategoryRules,
+                          [{'category': 'NOSUCH'}])
+        self.assertRaises(RulesError, CategoryRules,
+                          [{'category': 'XFEE', 'contains': 'a', 'match': 'b'}])
+        self.assertRaises(RulesError, CategoryRules,
+                          [{'category': 'XFEE', 'match': '('}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#
+#   The Trade Herder Scripts
+#   Copyright (C) 2013-2014 Robert Iwancz
+#   www.voidynullness.net
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+############################################################################
+#
+#  trade-herder.py
+#
+#  Runs any of the scripts as a subcommand, e.g.
+#
+#    ./trade-herder.py cfd-import --bulk statements/
+#    ./trade-herder.py --db sqlite:///2014.db cfd-report --fyau 2014
+#
+#  Only the script for the command is loaded, and it loads the models (and
+#  SQLAlchemy) after checking its arguments, so --help etc. are quick.
+#
+
+from __future__ import print_function
+import os
+import sys
+import runpy
+import argparse
+import collections
+
+
+# command --> (script, environment variable for its database, description)
+COMMANDS = collections.OrderedDict([
+    ('cfd-create-db', ('cfd-create-db.py', 'TH_CFD_DB',
+                       'create (or recreate) the CFD database')),
+    ('cfd-import', ('cfd-import.py', 'TH_CFD_DB',
+                    'import CFD transaction files')),
+    ('cfd-categorise', ('cfd-categorise.py', 'TH_CFD_DB',
+                        'categorise imported transactions')),
+    ('cfd-process', ('cfd-process.py', 'TH_CFD_DB',
+                     'generate positions and trades')),
+    ('cfd-report', ('cfd-report.py', 'TH_CFD_DB',
+                    'summary of transaction totals')),
+    ('cfd-csv-export', ('cfd-csv-export.py', 'TH_CFD_DB',
+                        'export trades and cash transactions to CSV')),
+    ('cfd-migrate-db', ('cfd-migrate-db.py', 'TH_CFD_DB',
+                        'convert currency storage, add indexes')),
+    ('eto-create-db', ('eto-create-db.py', 'TH_ETO_DB',
+                       'create (or recreate) the options database')),
+    ('eto-import', ('eto-import.py', 'TH_ETO_DB',
+                    'import option activity files')),
+    ('eto-process', ('eto-process.py', 'TH_ETO_DB',
+                     'match option activities into trades')),
+    ('eto-csv-export', ('eto-csv-export.py', 'TH_ETO_DB',
+                        'export option trade events to CSV')),
+    ('eto-migrate-db', ('eto-migrate-db.py', 'TH_ETO_DB',
+                        'convert currency storage, add indexes')),
+    ('cs2ss', ('cs2ss.py', None,
+               'match CommSec buys and sells (csin.csv)')),
+    ('csv-us2au-date', ('csv_us2au_date.py', None,
+                        'convert US dates in a CSV file')),
+    # Uses both databases (see its --cfd-db and --eto-db).
+    ('report-server', ('report-server.py', None,
+                       'serve reports from memory over local HTTP')),
+])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+                description='trade-herder: run a trade herder script',
+                formatter_class=argparse.RawDescriptionHelpFormatter,
+                epilog='commands:\n' + '\n'.join(
+                    '  %-16s %s' % (name, c[2]) for name, c in COMMANDS.items()))
+    parser.add_argument('--db', metavar='URL',
+                        help='database for the command, e.g. sqlite:///2014.db '
+                        '(default as configured)')
+    parser.add_argument('COMMAND', choices=COMMANDS, metavar='COMMAND',
+                        help='one of the commands below')
+    parser.add_argument('ARGS', nargs=argparse.REMAINDER,
+                        help='arguments for the command (see COMMAND --help)')
+    args = parser.parse_args()
+
+    script, db_var, desc = COMMANDS[args.COMMAND]
+    if args.db:
+        if db_var is None:
+            parser.error("--db can't be used with %s" % args.COMMAND)
+        os.environ[db_var] = args.db
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), script)
+    sys.argv = [path] + args.ARGS
+    runpy.run_path(path, run_name='__main__')
+
+
+if __name__ == "__main__":
+    main()